@@ -1,11 +1,79 @@
 #!/usr/bin/python3
 import argparse
+import sqlite3
+import sys
 
 from src.dotnet8.bootstrapper import Dotnet8Bootstrapper
 from src.dotnet9.bootstrapper import Dotnet9Bootstrapper
+from src.service import client
+from src.service.server import DEFAULT_SOCKET, BootstrapService
+from src.utils.history import DEFAULT_HISTORY_DB, RunHistory, print_history
+from src.utils.logs import print_failure
+
+def history(argv: list[str]):
+    parser = argparse.ArgumentParser(prog="bootstrap.py history",
+                                     description="Compare previous bootstrap runs and flag stage regressions")
+
+    parser.add_argument('--history-db', type=str, help="Run history database", default=DEFAULT_HISTORY_DB)
+    parser.add_argument('--version', type=str, help="Only show runs of this .NET version", default=None)
+    parser.add_argument('--arch', type=str, help="Only show runs for this architecture",
+                        choices=['amd64', 'arm64', 's390x', 'ppc64le'], default=None)
+    parser.add_argument('--stage', type=str, help="Only show this stage", default=None)
+    parser.add_argument('--threshold', type=float, help="Slowdown, in percent, reported as a regression",
+                        default=20)
+
+    args = parser.parse_args(argv)
+
+    print_history(RunHistory(args.history_db), args.version, args.arch, args.stage, args.threshold / 100)
+
+def serve(argv: list[str]):
+    parser = argparse.ArgumentParser(prog="bootstrap.py serve",
+                                     description="Run a bootstrap service that accepts jobs over a Unix socket")
+
+    parser.add_argument('--workspace', type=str, help="Directory holding job working directories and shared caches",
+                        required=True)
+    parser.add_argument('--socket', type=str, help="Unix socket to listen on", default=DEFAULT_SOCKET)
+    parser.add_argument('--max-jobs', type=int, help="Maximum number of concurrent jobs", default=1)
+    parser.add_argument('bootstrap_args', nargs=argparse.REMAINDER,
+                        help="Extra arguments passed to every bootstrap, after a '--'")
+
+    args = parser.parse_args(argv)
+    bootstrap_args = args.bootstrap_args[1:] if args.bootstrap_args[:1] == ['--'] else args.bootstrap_args
+
+    BootstrapService(args.workspace, args.socket, args.max_jobs, bootstrap_args).serve_forever()
+
+def submit(argv: list[str]):
+    parser = argparse.ArgumentParser(prog="bootstrap.py submit",
+                                     description="Submit a bootstrap job to a running service and follow its progress")
+
+    parser.add_argument('--socket', type=str, help="Unix socket of the service", default=DEFAULT_SOCKET)
+    parser.add_argument('--version', type=str, help=".NET version to bootstrap per the VMR repo git tag", required=True)
+    parser.add_argument('--arch', type=str, help="The architecture on which to bootstrap .NET",
+                        choices=['amd64', 'arm64', 's390x', 'ppc64le'], default='amd64')
+
+    args = parser.parse_args(argv)
+
+    exit(client.submit(args.socket, args.version, args.arch))
+
+def status(argv: list[str]):
+    parser = argparse.ArgumentParser(prog="bootstrap.py status", description="List the jobs of a running service")
+
+    parser.add_argument('--socket', type=str, help="Unix socket of the service", default=DEFAULT_SOCKET)
+
+    args = parser.parse_args(argv)
+
+    client.status(args.socket)
 
 def main():
-    parser = argparse.ArgumentParser(description="The .NET Bootstrap Tool")
+    commands = {"history": history, "serve": serve, "submit": submit, "status": status}
+    if len(sys.argv) > 1 and sys.argv[1] in commands:
+        commands[sys.argv[1]](sys.argv[2:])
+        return
+
+    parser = argparse.ArgumentParser(description="The .NET Bootstrap Tool",
+                                     epilog="Other commands: 'history' compares previous runs, 'serve' runs a bootstrap "
+                                            "service, 'submit' and 'status' talk to it. Run "
+                                            "'bootstrap.py <command> --help' for details.")
 
     # Expected arguments
     parser.add_argument('--version', type=str, help=".NET version to bootstrap per the VMR repo git tag", required=True)
@@ -13,6 +81,33 @@ def main():
                         choices=['amd64', 'arm64', 's390x', 'ppc64le'], default='amd64')
 
     parser.add_argument('--working-dir', type=str, help="Working directory", default=None)
+    parser.add_argument('--skip-preflight', action='store_true',
+                        help="Skip the props, patch, disk, memory and toolchain checks run before building")
+    parser.add_argument('--history-db', type=str, help="Run history database", default=DEFAULT_HISTORY_DB)
+    parser.add_argument('--deb-cache-dir', type=str, default=None,
+                        help="Directory in which to cache .deb packages downloaded by apt and debootstrap")
+    parser.add_argument('--deb-cache-size', type=int, help="Maximum size of the .deb cache in GiB", default=10)
+    parser.add_argument('--deb-cache-max-age', type=int, default=30,
+                        help="Days after which packages not used since are dropped from the .deb cache")
+    parser.add_argument('--sparse-checkout', action='store_true',
+                        help="Only check out the VMR components that are built, "
+                             "widening the checkout if a build needs more")
+    parser.add_argument('--stall-timeout', type=int, default=60,
+                        help="Minutes without output or CPU activity after which a command is killed (0 to disable)")
+    parser.add_argument('--retries', type=int, help="Attempts for transient steps such as downloads", default=3)
+    parser.add_argument('--skip-package-install', action='store_true',
+                        help="Don't install the required packages with apt, e.g. because a previous run did")
+    parser.add_argument('--vmr-mirror', type=str, default=None,
+                        help="Local mirror of the VMR to borrow objects from when cloning")
+    parser.add_argument('--rootfs-store', type=str, default=None,
+                        help="Directory in which to keep cross rootfs directories shared between working directories")
+    parser.add_argument('--console-output', action='store_true',
+                        help="Print the full output of build commands instead of progress lines, "
+                             "in addition to the stage logs")
+    parser.add_argument('--binlog', action='store_true',
+                        help="Keep the MSBuild binary logs of each build and report its slowest projects and targets")
+    parser.add_argument('--toolchain-store', type=str, default=None,
+                        help="Directory in which to share the .NET SDKs and Arcade tooling restored by component builds")
 
     # Parse the command line arguments
     args = parser.parse_args()
@@ -25,13 +120,47 @@ def main():
     print("-----------------------------------")
 
     if args.version[0] == '8':
-        bootstrapper = Dotnet8Bootstrapper(args.version, args.arch, args.working_dir)
-        bootstrapper.prepare()
-        bootstrapper.build()
+        bootstrapper_class = Dotnet8Bootstrapper
     elif args.version[0] == '9':
-        bootstrapper = Dotnet9Bootstrapper(args.version, args.arch, args.working_dir)
+        bootstrapper_class = Dotnet9Bootstrapper
+    else:
+        print(f".NET version {args.version} is not supported")
+        exit(-1)
+
+    bootstrapper = bootstrapper_class(args.version, args.arch, args.working_dir,
+                                      deb_cache_dir=args.deb_cache_dir,
+                                      deb_cache_size=args.deb_cache_size * 1024 ** 3,
+                                      deb_cache_max_age=args.deb_cache_max_age * 24 * 3600,
+                                      sparse_checkout=args.sparse_checkout,
+                                      stall_timeout=args.stall_timeout * 60 if args.stall_timeout > 0 else None,
+                                      retries=args.retries,
+                                      skip_package_install=args.skip_package_install,
+                                      vmr_mirror=args.vmr_mirror,
+                                      rootfs_store=args.rootfs_store,
+                                      console_output=args.console_output,
+                                      binlog=args.binlog,
+                                      toolchain_store=args.toolchain_store)
+
+    exit_status = 1
+    try:
         bootstrapper.prepare()
+        if not args.skip_preflight:
+            bootstrapper.preflight()
         bootstrapper.build()
+        exit_status = 0
+    except SystemExit as e:
+        exit_status = e.code if isinstance(e.code, int) else 1
+        raise
+    finally:
+        if exit_status != 0 and len(bootstrapper.Record.Failures) > 0:
+            # Repeat the last failure so it is the last thing on the console
+            print_failure(*bootstrapper.Record.Failures[-1])
+        # Failing to record the run must not hide how the bootstrap itself went
+        try:
+            run_id = RunHistory(args.history_db).save(bootstrapper.Record, exit_status)
+            print(f"Recorded run #{run_id} in {args.history_db}")
+        except (sqlite3.Error, OSError) as e:
+            print(f"Warning: could not record the run in {args.history_db}: {e}")
 
 if __name__ == "__main__":
     main()
@@ -1,24 +1,64 @@
+import fcntl
 import glob
+import hashlib
 import os
-from pathlib import Path
+import re
 import requests
+import shutil
 import subprocess
 import tarfile
 import tempfile
-
-from src.utils.files import copy_files, replace_in_file
-from src.utils.patches import apply_patch, extract_file_path_from_patch
+import time
+
+from src.utils.debcache import DebCacheProxy
+from src.utils.binlog import write_binlog_report
+from src.utils.files import copy_files, remove_directory
+from src.utils.history import RunRecord
+from src.utils.logs import StageLog, print_failure
+from src.utils.nuget import add_packages_to_feed
+from src.utils.patches import PatchSet
+from src.utils.preflight import check_disk_space, check_memory, check_props, check_tools
+from src.utils.process import ProcessStalledError, retry, run_supervised
+from src.utils.toolchain import ToolchainStore
+from src.utils.verify import verify_artifacts
 from src.utils.xml import get_xml_tag_content
 
 
 class Dotnet9Bootstrapper:
 
+    # VMR paths read or built by this bootstrapper, checked out when using a sparse checkout
+    SparseCheckoutPaths = ["prereqs/git-info", "src/runtime", "src/aspnetcore", "src/sdk"]
+
     def __init__(self,
                  version: str,
                  arch: str,
-                 working_directory: str | None):
+                 working_directory: str | None,
+                 deb_cache_dir: str | None = None,
+                 deb_cache_size: int = 10 * 1024 ** 3,
+                 deb_cache_max_age: int = 30 * 24 * 3600,
+                 sparse_checkout: bool = False,
+                 stall_timeout: int | None = 3600,
+                 retries: int = 3,
+                 skip_package_install: bool = False,
+                 vmr_mirror: str | None = None,
+                 rootfs_store: str | None = None,
+                 console_output: bool = False,
+                 binlog: bool = False,
+                 toolchain_store: str | None = None):
         self.Version = version
         self.Arch = arch
+        self.Record = RunRecord(version, arch)
+        self.DebCache = DebCacheProxy(deb_cache_dir, deb_cache_size, deb_cache_max_age) \
+            if deb_cache_dir is not None else None
+        self.SparseCheckout = sparse_checkout
+        self.StallTimeout = stall_timeout
+        self.Retries = retries
+        self.SkipPackageInstall = skip_package_install
+        self.VmrMirror = vmr_mirror
+        self.RootfsStore = rootfs_store
+        self.ConsoleOutput = console_output
+        self.Binlog = binlog
+        self.Toolchains = ToolchainStore(toolchain_store) if toolchain_store is not None else None
         if working_directory is None:
             self.WorkingDirectory = tempfile.mkdtemp()
         else:
@@ -33,6 +73,7 @@ class Dotnet9Bootstrapper:
         self.PackagesDir = os.path.join(self.WorkingDirectory, "local-packages")
         self.DownloadsDir = os.path.join(self.WorkingDirectory, "local-downloads")
         self.OutputDir = os.path.join(self.WorkingDirectory, "output")
+        self.LogsDir = os.path.join(self.WorkingDirectory, "logs")
 
         if not os.path.exists(self.PackagesDir):
             os.mkdir(self.PackagesDir)
@@ -41,27 +82,92 @@ class Dotnet9Bootstrapper:
         if not os.path.exists(self.OutputDir):
             os.mkdir(self.OutputDir)
 
-        self._install_required_packages()
-        self._install_nodejs()
-        self._clone_repositories()
+        self.Patches = self._load_patches()
+
+        if self.DebCache is not None:
+            self.DebCache.start()
+
+        with self.Record.stage("packages"):
+            if self.SkipPackageInstall:
+                print("Skipping installation of required packages")
+                self.Record.cache_hit("packages")
+            else:
+                self._install_required_packages()
+        with self.Record.stage("nodejs"):
+            self._install_nodejs()
+        with self.Record.stage("clone"):
+            self._clone_repositories()
 
     def build(self):
         # runtime
-        self._build_runtime()
+        self._build_stage("runtime", self._build_runtime)
 
         # aspnetcore
-        self._patch_aspnetcore()
-        self._build_aspnetcore()
+        self._build_stage("aspnetcore", self._patch_aspnetcore, self._build_aspnetcore)
 
         # sdk
-        self._patch_sdk()
-        self._build_sdk()
+        self._build_stage("sdk", self._patch_sdk, self._build_sdk)
+
+        # verification
+        with self.Record.stage("verify"):
+            self._verify_artifacts()
+
+        for directory in [self.OutputDir, self.PackagesDir, self.DownloadsDir]:
+            self.Record.record_artifacts(directory)
+
+        if self.DebCache is not None:
+            self.DebCache.stop()
 
         print("Bootstrap build finished.")
 
+    def preflight(self):
+        print("-----------------------------------")
+        print("Running preflight checks")
+        print("-----------------------------------")
+
+        vmr_root = os.path.join(self.WorkingDirectory, "dotnet")
+        required_props = {
+            "runtime.props": ["OutputPackageVersion", "OfficialBuildId"],
+            "aspnetcore.props": ["OutputPackageVersion", "OfficialBuildId"],
+            "sdk.props": ["OutputPackageVersion", "OfficialBuildId"]
+        }
+        errors = check_props(os.path.join(vmr_root, "prereqs", "git-info"), required_props)
+
+        for component, patch_set in self.Patches.items():
+            if len(patch_set.FilePatches) == 0:
+                errors.append(f"No patches found for {component}")
+            errors += patch_set.check(os.path.join(vmr_root, "src", component))
+
+        errors += check_disk_space(self.WorkingDirectory, self.Arch)
+        errors += check_memory(self.Arch)
+
+        tools = ["git", "tar", "make", "cmake", "clang"]
+        if self.Arch != "amd64":
+            qemu_arch = {"arm64": "aarch64", "s390x": "s390x", "ppc64le": "ppc64le"}[self.Arch]
+            tools.extend(["debootstrap", f"qemu-{qemu_arch}-static"])
+        errors += check_tools(tools)
+        errors += check_tools(["node"], os.path.join(self.WorkingDirectory, "node", "bin"))
+
+        if len(errors) > 0:
+            print("Preflight checks failed:")
+            for error in errors:
+                print(f"  - {error}")
+            exit(-1)
+
+        print("Preflight checks passed.")
+
     # ----------------------------------------------
     #              PREPARATION STAGE               |
     # ----------------------------------------------
+    def _load_patches(self) -> dict[str, PatchSet]:
+        # Patches are named after the VMR component they apply to
+        return {
+            "aspnetcore": PatchSet(glob.glob("src/dotnet9/patches/aspnetcore-*.patch"),
+                                   {"@@DOWNLOADS_DIR_PATH@@": os.path.abspath(self.DownloadsDir)}),
+            "sdk": PatchSet(glob.glob("src/dotnet9/patches/sdk-*.patch"),
+                            {"@@PACKAGES_DIR_PATH@@": os.path.abspath(self.PackagesDir)})
+        }
+
     def _install_required_packages(self) -> None:
         print("-----------------------------------")
         print("Installing required packages")
@@ -103,9 +209,17 @@ class Dotnet9Bootstrapper:
         env['DEBIAN_FRONTEND'] = 'noninteractive'
         env['NEEDRESTART_MODE'] = 'a'
 
-        subprocess.run(["apt-get", "update"], env=env, check=True)
-        subprocess.run(["apt-get", "upgrade", "-y"], env=env, check=True)
-        subprocess.run(["apt-get", "install", "-y"] + packages, env=env, check=True)
+        # Wait for other bootstraps on this host to release the dpkg lock instead of failing
+        apt_options = ["-o", "DPkg::Lock::Timeout=3600"]
+        if self.DebCache is not None:
+            apt_options += ["-o", f"Acquire::http::Proxy={self.DebCache.url()}"]
+
+        retry(lambda: self._run(["apt-get"] + apt_options + ["update"], None, env),
+              self.Retries, "apt-get update")
+        retry(lambda: self._run(["apt-get"] + apt_options + ["upgrade", "-y"], None, env),
+              self.Retries, "apt-get upgrade")
+        retry(lambda: self._run(["apt-get"] + apt_options + ["install", "-y"] + packages, None, env),
+              self.Retries, "apt-get install")
 
     def _install_nodejs(self) -> None:
         print("-----------------------------------")
@@ -116,22 +230,29 @@ class Dotnet9Bootstrapper:
         if os.path.exists(destination_directory):
             print(f"Node.js directory already exists at {destination_directory}")
             print("If this directory is incomplete or wrong, please remove it and run this script again.")
+            self.Record.cache_hit("node")
             return
         
         print("Downloading Node.js...")
 
         download_url = "https://nodejs.org/dist/v18.20.4/node-v18.20.4-linux-x64.tar.xz"
-        response = requests.get(download_url)
         destination_file = os.path.join(self.WorkingDirectory, "node.tar.gz")
 
-        if response.status_code == 200:
-            with open(destination_file, 'wb') as file:
-                file.write(response.content)
-            print("Node.JS installed successfully!")
-        else:
+        def download():
+            response = requests.get(download_url, timeout=300)
+            response.raise_for_status()
+            return response
+
+        try:
+            response = retry(download, self.Retries, "Node.js download", retry_on=(requests.RequestException,))
+        except requests.RequestException:
             print("Could not download Node.js")
             exit(-1)
 
+        with open(destination_file, 'wb') as file:
+            file.write(response.content)
+        print("Node.JS installed successfully!")
+
         print("Extracting Node.js...")
         with tarfile.open(destination_file, "r:xz") as tar:
             tar.extractall(path=self.WorkingDirectory)
@@ -160,15 +281,165 @@ class Dotnet9Bootstrapper:
 
         for repo in repos:
             repo_name = repo["url"].split('/')[-1]
-            if not os.path.exists(self.WorkingDirectory + "/" + repo_name):
-                subprocess.run(["git", "clone", repo["url"]], cwd=self.WorkingDirectory)
-            subprocess.run(["git", "checkout", repo["tag"]], cwd=os.path.join(self.WorkingDirectory, repo_name))
-            subprocess.run(["git", "submodule", "init"], cwd=os.path.join(self.WorkingDirectory, repo_name))
-            subprocess.run(["git", "submodule", "update"], cwd=os.path.join(self.WorkingDirectory, repo_name))
+            repo_dir = os.path.join(self.WorkingDirectory, repo_name)
+            if not os.path.exists(repo_dir):
+                clone_command = ["git", "clone", repo["url"]]
+                if self.SparseCheckout:
+                    # Only fetch the blobs of the paths that get checked out
+                    clone_command = ["git", "clone", "--filter=blob:none", "--no-checkout", repo["url"]]
+                if self.VmrMirror is not None:
+                    # Borrow objects from a local mirror, only fetching what it is missing
+                    clone_command[2:2] = ["--reference-if-able", self.VmrMirror]
+
+                def clone():
+                    try:
+                        self._run(clone_command, self.WorkingDirectory)
+                    except (subprocess.CalledProcessError, ProcessStalledError):
+                        # Don't leave a partial clone behind for the next attempt
+                        shutil.rmtree(repo_dir, ignore_errors=True)
+                        raise
+
+                retry(clone, self.Retries, f"Cloning {repo_name}")
+            else:
+                self.Record.cache_hit(repo_name)
+
+            if self.SparseCheckout:
+                print(f"Using a sparse checkout of {', '.join(self.SparseCheckoutPaths)}")
+                # Check out the tag before widening the cone to the paths, so only the tagged tree is
+                # fetched and not the default branch the clone started on
+                subprocess.run(["git", "sparse-checkout", "init", "--cone"], cwd=repo_dir, check=True)
+                subprocess.run(["git", "checkout", repo["tag"]], cwd=repo_dir)
+                subprocess.run(["git", "sparse-checkout", "set", "--cone"] + self.SparseCheckoutPaths,
+                               cwd=repo_dir, check=True)
+                retry(lambda: self._run(["git", "submodule", "update", "--init", "--"] + self.SparseCheckoutPaths,
+                                        repo_dir),
+                      self.Retries, "Updating submodules")
+            else:
+                subprocess.run(["git", "checkout", repo["tag"]], cwd=repo_dir)
+                subprocess.run(["git", "submodule", "init"], cwd=repo_dir)
+                retry(lambda: self._run(["git", "submodule", "update"], repo_dir), self.Retries, "Updating submodules")
+
+    def _reached_outside_checkout(self) -> bool:
+        # A build that reached outside the sparse checkout mentions VMR paths that weren't checked out
+        if len(self.Record.Failures) == 0 or self.Record.Failures[-1][0] != self.Record.CurrentStage:
+            return False
+        vmr_root = os.path.join(self.WorkingDirectory, "dotnet")
+        _, _, _, tail, errors = self.Record.Failures[-1]
+        for line in errors + tail:
+            for path in re.findall(r'/[^\s\'"():;,\[\]]+', line):
+                path = os.path.normpath(path)
+                if not path.startswith(vmr_root + os.sep) or os.path.exists(path):
+                    continue
+                relative_path = os.path.relpath(path, vmr_root)
+                if not any(relative_path == sparse_path or relative_path.startswith(sparse_path + os.sep)
+                           for sparse_path in self.SparseCheckoutPaths):
+                    print(f"The build needs '{relative_path}', which is outside the sparse checkout")
+                    return True
+        return False
+
+    def _widen_checkout(self) -> bool:
+        repo_dir = os.path.join(self.WorkingDirectory, "dotnet")
+        if not self.SparseCheckout or not os.path.isdir(repo_dir):
+            return False
+
+        print("-----------------------------------")
+        print("Widening sparse checkout to the full VMR")
+        print("-----------------------------------")
+
+        subprocess.run(["git", "sparse-checkout", "disable"], cwd=repo_dir, check=True)
+        subprocess.run(["git", "submodule", "update", "--init"], cwd=repo_dir, check=True)
+        self.SparseCheckout = False
+        return True
+
+    def _run(self, command: list[str], cwd: str | None, env: dict | None = None) -> None:
+        # Output is captured into a compressed log per stage, the console only gets progress lines
+        stage = self.Record.CurrentStage or "bootstrap"
+        with StageLog(os.path.join(self.LogsDir, f"{stage}.log.gz"), stage, command, self.ConsoleOutput) as log:
+            try:
+                run_supervised(command, cwd=cwd, env=env, stall_timeout=self.StallTimeout,
+                               report_dir=os.path.join(self.WorkingDirectory, "stalls"), log=log)
+            except (subprocess.CalledProcessError, ProcessStalledError) as e:
+                if isinstance(e, ProcessStalledError):
+                    self.Record.stall(e.Command, e.ReportPath)
+                tail, errors = log.failure_summary()
+                self.Record.failure(command, log.Path, tail, errors)
+                if not self.ConsoleOutput:
+                    print_failure(stage, ' '.join(command), log.Path, tail, errors)
+                raise
+
+    def _run_build(self, build_command: list[str], repo_root: str, env: dict | None = None) -> None:
+        # Skip the SDK and Arcade acquisition of eng/common/tools.sh when another build already did it
+        if self.Toolchains is not None:
+            for name in self.Toolchains.restore(repo_root):
+                print(f"Using {name} from the toolchain store")
+                self.Record.cache_hit(name)
+
+        if self.Binlog:
+            build_command = build_command + ["-bl"]
+        started = time.time()
+        try:
+            self._run(build_command, repo_root, env)
+        finally:
+            if self.Binlog:
+                self._report_binlogs(repo_root, started)
+
+        # Only share toolchains of successful builds, a failed one may have been interrupted while acquiring them
+        if self.Toolchains is not None:
+            for name in self.Toolchains.harvest(repo_root):
+                print(f"Added {name} to the toolchain store")
+
+    def _report_binlogs(self, repo_root: str, started: float) -> None:
+        # Keep copies of the binary logs with the stage logs, MSBuild rewrites the same files in place
+        # on the next build of the component. Binary logs left by earlier builds are skipped.
+        stage = self.Record.CurrentStage or "bootstrap"
+        binlog_dir = os.path.join(self.LogsDir, stage)
+        os.makedirs(binlog_dir, exist_ok=True)
+        binlogs = []
+        log_root = os.path.join(repo_root, "artifacts", "log")
+        for binlog in glob.glob(os.path.join(log_root, "**", "*.binlog"), recursive=True):
+            if os.path.getmtime(binlog) < started:
+                continue
+            destination = os.path.join(binlog_dir, os.path.relpath(binlog, log_root).replace(os.sep, "-"))
+            shutil.copy2(binlog, destination)
+            binlogs.append(destination)
+
+        print("-----------------------------------")
+        print(f"MSBuild report for {stage}")
+        print("-----------------------------------")
+
+        # The SDK the component restored can replay its own binary logs
+        dotnet = os.path.join(repo_root, ".dotnet", "dotnet")
+        if not os.path.exists(dotnet):
+            dotnet = shutil.which("dotnet")
+        if len(binlogs) == 0 or dotnet is None:
+            print(f"No binary logs or no dotnet to replay them with, skipping the report for {stage}")
+            return
+
+        try:
+            report = write_binlog_report(stage, binlogs, dotnet, os.path.join(binlog_dir, "binlog-report.txt"))
+        except (subprocess.CalledProcessError, OSError) as e:
+            print(f"Could not replay the binary logs of {stage}: {e}")
+            return
+        for line in report:
+            print(line)
 
     # ----------------------------------------------
     #                 BUILD STAGE                  |
     # ----------------------------------------------
+    def _build_stage(self, name: str, *steps) -> None:
+        with self.Record.stage(name):
+            try:
+                for step in steps:
+                    step()
+            except subprocess.CalledProcessError:
+                # Retry once with the full VMR if the build reached outside the sparse checkout,
+                # any other failure would only fail again after rebuilding the whole stage
+                if not self.SparseCheckout or not self._reached_outside_checkout() or not self._widen_checkout():
+                    raise
+                print(f"{name} failed using a sparse checkout, retrying with the full VMR checked out")
+                for step in steps:
+                    step()
+
     def _build_runtime(self) -> None:
         configuration = "Release"
         repo_root = os.path.join(self.WorkingDirectory, "dotnet", "src", "runtime")
@@ -197,18 +468,43 @@ class Dotnet9Bootstrapper:
         if self.Arch != "amd64":
             print(f"Arch is {self.Arch}, needs to build crossrootfs")
             rootfs = os.path.abspath(os.path.join(repo_root, ".tools/rootfs/", self.Arch))
+            rootfs_command = ["./eng/common/cross/build-rootfs.sh", self.Arch, "bionic"]
+            if self.RootfsStore is not None:
+                # Versions of build-rootfs.sh differ in distro and packages, only share rootfs built alike
+                with open(os.path.join(repo_root, rootfs_command[0]), 'rb') as script:
+                    rootfs_key = hashlib.sha256(script.read() + ' '.join(rootfs_command[1:]).encode()).hexdigest()
+                rootfs = os.path.abspath(os.path.join(self.RootfsStore, f"{self.Arch}-{rootfs_key[:16]}"))
             print(f"Using rootfs = {rootfs}")
-            if not os.path.exists(rootfs):
-                subprocess.run(["./eng/common/cross/build-rootfs.sh", self.Arch, "bionic"],
-                               cwd=repo_root, check=True)
-            else:
-                print(f"Crossrootfs directory found at {rootfs}")
+
+            # Only one bootstrap at a time may build a rootfs shared through the rootfs store
+            os.makedirs(os.path.dirname(rootfs), exist_ok=True)
+            with open(rootfs + ".lock", 'w') as rootfs_lock:
+                fcntl.flock(rootfs_lock, fcntl.LOCK_EX)
+                if not os.path.exists(rootfs):
+                    # debootstrap and the apt-get calls inside the rootfs chroot honor http_proxy
+                    rootfs_env = os.environ.copy()
+                    rootfs_env['ROOTFS_DIR'] = rootfs
+                    if self.DebCache is not None:
+                        rootfs_env['http_proxy'] = self.DebCache.url()
+
+                    def build_rootfs():
+                        try:
+                            self._run(rootfs_command, repo_root, rootfs_env)
+                        except (subprocess.CalledProcessError, ProcessStalledError):
+                            # debootstrap can't resume a partial rootfs, start over on the next attempt
+                            remove_directory(rootfs)
+                            raise
+
+                    retry(build_rootfs, self.Retries, "Building crossrootfs")
+                else:
+                    print(f"Crossrootfs directory found at {rootfs}")
+                    self.Record.cache_hit("rootfs")
 
         # Create a copy of the current environment and add/modify the variable
         env = os.environ.copy()
         env['ROOTFS_DIR'] = rootfs
 
-        subprocess.run(build_command, env=env, cwd=repo_root, check=True)
+        self._run_build(build_command, repo_root, env)
         
         # Define the source directory and file patterns
         source_dir = f'{repo_root}/artifacts/packages/{configuration}/Shipping'
@@ -227,9 +523,9 @@ class Dotnet9Bootstrapper:
             f'{source_dir}/runtime.linux-{self.Arch}.Microsoft.NETCore.ILDAsm.*.nupkg'
         ]
 
-        # Copy files to PACKAGESDIR
+        # Add files to the PACKAGESDIR feed
         for pattern in patterns[:2]:
-            copy_files(pattern, self.PackagesDir)
+            add_packages_to_feed(pattern, self.PackagesDir)
 
         # Copy files to DOWNLOADDIR
         download_pattern = f'{source_dir}/dotnet-runtime-*-linux-{self.Arch}.tar.gz'
@@ -247,21 +543,9 @@ class Dotnet9Bootstrapper:
         print("-----------------------------------")
 
         repo_root = os.path.join(self.WorkingDirectory, "dotnet", "src", "aspnetcore")
-        patched_flag_file = Path(os.path.join(repo_root, "bootstrap-patched"))
-        if (patched_flag_file.exists()):
-            print("aspnetcore has already been patched. Skipping...")
-            return
-
-        for patch in glob.glob("src/dotnet9/patches/aspnetcore-*.patch"):
-            print(f"Applying {patch}")
-            # Replace @@DOWNLOADS_DIR_PATH@@
-            patch_path = os.path.abspath(patch)
-            updated_content = replace_in_file(
-                patch_path, "@@DOWNLOADS_DIR_PATH@@", os.path.abspath(self.DownloadsDir))
-            file_path = extract_file_path_from_patch(updated_content)
-            apply_patch(updated_content, os.path.join(repo_root, file_path))
-
-        patched_flag_file.touch()
+        if not self.Patches["aspnetcore"].apply(repo_root):
+            print("aspnetcore has already been patched.")
+            self.Record.cache_hit("aspnetcore-patches")
 
     def _build_aspnetcore(self) -> None:
         configuration = "Release"
@@ -299,7 +583,7 @@ class Dotnet9Bootstrapper:
         aspnetcore_downloads_dir = os.path.join(self.DownloadsDir, "aspnetcore", "Runtime", aspnetcore_version)
         os.makedirs(aspnetcore_downloads_dir, exist_ok=True)
 
-        subprocess.run(build_command, cwd=repo_root, env=env, check=True)
+        self._run_build(build_command, repo_root, env)
         
         # Define the source directory and file patterns
         source_dir = f'{repo_root}/artifacts'
@@ -316,9 +600,9 @@ class Dotnet9Bootstrapper:
             f'{source_dir}/packages/{configuration}/Shipping/Microsoft.AspNetCore.App.Runtime.linux-{self.Arch}.*.nupkg'
         ]
 
-        # Copy files to PACKAGESDIR
+        # Add files to the PACKAGESDIR feed
         for pattern in patterns[:2]:
-            copy_files(pattern, self.PackagesDir)
+            add_packages_to_feed(pattern, self.PackagesDir)
 
         # Copy files to DOWNLOADDIR
         for pattern in patterns[2:4]:
@@ -336,21 +620,9 @@ class Dotnet9Bootstrapper:
         print("-----------------------------------")
 
         repo_root = os.path.join(self.WorkingDirectory, "dotnet", "src", "sdk")
-        patched_flag_file = Path(os.path.join(repo_root, "bootstrap-patched"))
-        if (patched_flag_file.exists()):
-            print("sdk has already been patched. Skipping...")
-            return
-
-        for patch in glob.glob("src/dotnet9/patches/sdk-*.patch"):
-            print(f"Applying {patch}")
-            # Replace @@PACKAGES_DIR_PATH@@
-            patch_path = os.path.abspath(patch)
-            updated_content = replace_in_file(
-                patch_path, "@@PACKAGES_DIR_PATH@@", os.path.abspath(self.PackagesDir))
-            file_path = extract_file_path_from_patch(updated_content)
-            apply_patch(updated_content, os.path.join(repo_root, file_path))
-
-        patched_flag_file.touch()
+        if not self.Patches["sdk"].apply(repo_root):
+            print("sdk has already been patched.")
+            self.Record.cache_hit("sdk-patches")
 
     def _build_sdk(self) -> None:
         configuration = "Release"
@@ -370,7 +642,7 @@ class Dotnet9Bootstrapper:
         print(f"Build command = {' '.join(build_command)}")
         print("-----------------------------------")
 
-        subprocess.run(build_command, cwd=repo_root, check=True)
+        self._run_build(build_command, repo_root)
 
         # Define the source directory and file patterns
         source_dir = f'{repo_root}/artifacts/packages/{configuration}'
@@ -378,3 +650,27 @@ class Dotnet9Bootstrapper:
         copy_files(f"{source_dir}/Shipping/dotnet-sdk-*-linux-{self.Arch}.tar.gz", self.OutputDir)
 
         print("Files copied successfully.")
+
+    def _verify_artifacts(self) -> None:
+        print("-----------------------------------")
+        print("Verifying artifacts")
+        print("-----------------------------------")
+
+        # Runtime and ASP.NET Core packages must carry the versions from the props files
+        props_dir = os.path.join(self.WorkingDirectory, "dotnet", "prereqs", "git-info")
+        runtime_version = get_xml_tag_content(os.path.join(props_dir, "runtime.props"), "OutputPackageVersion")
+        aspnetcore_version = get_xml_tag_content(os.path.join(props_dir, "aspnetcore.props"), "OutputPackageVersion")
+        expected_versions = {
+            "Microsoft.NETCore.App.": runtime_version,
+            f"runtime.linux-{self.Arch}.Microsoft.NETCore.": runtime_version,
+            "Microsoft.AspNetCore.App.": aspnetcore_version
+        }
+
+        verified, errors = verify_artifacts([self.OutputDir, self.PackagesDir, self.DownloadsDir], expected_versions)
+        if len(errors) > 0:
+            print("Artifact verification failed:")
+            for error in errors:
+                print(f"  - {error}")
+            exit(-1)
+
+        print(f"Verified {verified} files.")
@@ -0,0 +1,44 @@
+import json
+import socket
+import time
+
+
+def request(socket_path: str, message: dict):
+    # Sends one request to the service and yields its newline-delimited JSON replies
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        connection.sendall((json.dumps(message) + "\n").encode())
+        with connection.makefile('r') as replies:
+            for line in replies:
+                yield json.loads(line)
+
+
+def submit(socket_path: str, version: str, arch: str) -> int:
+    for event in request(socket_path, {"command": "submit", "version": version, "arch": arch}):
+        if "error" in event:
+            print(f"Error: {event['error']}")
+            return 1
+
+        if event["event"] == "output":
+            print(event["line"])
+        elif event["event"] == "dropped":
+            print(f"... {event['count']} lines of output were dropped because this client fell behind")
+        elif event["event"] == "failed":
+            print(event["message"])
+        elif event["event"] == "finished":
+            print(f"Job #{event['job']} finished with exit status {event['exit_status']}")
+            return event["exit_status"]
+        else:
+            print(f"Job #{event['job']} {event['event']}")
+
+    print("Lost connection to the bootstrap service")
+    return 1
+
+
+def status(socket_path: str) -> None:
+    for reply in request(socket_path, {"command": "status"}):
+        for job in reply["jobs"]:
+            submitted = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(job["submitted_at"]))
+            exit_status = f" (exit status {job['exit_status']})" if job["exit_status"] is not None else ""
+            print(f"#{job['job']:<5} {submitted}  {job['version']:<10} {job['arch']:<8} "
+                  f"{job['state']}{exit_status}")
@@ -0,0 +1,255 @@
+import collections
+import itertools
+import json
+import os
+import queue
+import re
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+
+from src.utils.process import retry
+
+DEFAULT_SOCKET = "/run/dotnet-bootstrap.sock"
+VMR_URL = "https://github.com/dotnet/dotnet"
+BOOTSTRAP_SCRIPT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "bootstrap.py"))
+# Versions and architectures jobs may be submitted for, they end up in paths and command lines
+VERSION_PATTERN = re.compile(r'^[89]\.\d+\.\d+(-[0-9A-Za-z]+(\.[0-9A-Za-z]+)*)?$')
+SUPPORTED_ARCHS = ["amd64", "arm64", "s390x", "ppc64le"]
+# Number of output events kept per job for clients that attach to a job already in progress.
+# Other events ("queued", "started", "failed", "finished") are always kept.
+EVENT_HISTORY = 1000
+
+# The service speaks newline-delimited JSON over a Unix socket. A client sends one request:
+#   {"command": "submit", "version": "8.0.8", "arch": "s390x"}
+#       Queues a bootstrap, or attaches to an identical one already queued or running, and
+#       streams {"job", "seq", "event", ...} objects ("queued", "started", "output" with a
+#       "line", "failed" with a "message", "finished" with an "exit_status") until the job
+#       finishes. A client that falls behind by more than the output history gets a "dropped"
+#       event with the "count" of output events it missed.
+#   {"command": "status"}
+#       Replies with {"jobs": [...]} describing every job the service knows about.
+
+
+class Job:
+
+    def __init__(self, job_id: int, version: str, arch: str):
+        self.Id = job_id
+        self.Version = version
+        self.Arch = arch
+        self.State = "queued"
+        self.ExitStatus = None
+        self.SubmittedAt = time.time()
+        self.Events = collections.deque(maxlen=EVENT_HISTORY)
+        self.Milestones = []
+        self.Sequence = itertools.count()
+        self.Condition = threading.Condition()
+
+    def emit(self, event: str, **fields) -> None:
+        with self.Condition:
+            message = {"job": self.Id, "seq": next(self.Sequence), "event": event, **fields}
+            if event == "output":
+                self.Events.append(message)
+            else:
+                self.Milestones.append(message)
+            self.Condition.notify_all()
+
+    def follow(self):
+        # Yields the job's events, starting with the ones still in its history, until it finishes
+        last_seq = -1
+        while True:
+            with self.Condition:
+                pending = self._events_after(last_seq)
+                while len(pending) == 0:
+                    self.Condition.wait()
+                    pending = self._events_after(last_seq)
+
+            for event in pending:
+                if event["seq"] != last_seq + 1:
+                    # Output that went out of the history before this client read it
+                    yield {"job": self.Id, "seq": last_seq, "event": "dropped",
+                           "count": event["seq"] - last_seq - 1}
+                last_seq = event["seq"]
+                yield event
+                if event["event"] == "finished":
+                    return
+
+    def _events_after(self, seq: int) -> list[dict]:
+        events = [event for event in self.Milestones if event["seq"] > seq]
+        events += [event for event in self.Events if event["seq"] > seq]
+        return sorted(events, key=lambda event: event["seq"])
+
+    def describe(self) -> dict:
+        return {"job": self.Id, "version": self.Version, "arch": self.Arch, "state": self.State,
+                "exit_status": self.ExitStatus, "submitted_at": self.SubmittedAt}
+
+
+class BootstrapService:
+
+    def __init__(self, workspace: str, socket_path: str, max_jobs: int, bootstrap_args: list[str]):
+        self.Workspace = os.path.abspath(workspace)
+        self.SocketPath = socket_path
+        self.MaxJobs = max_jobs
+        self.BootstrapArgs = bootstrap_args
+
+        self.JobsDir = os.path.join(self.Workspace, "jobs")
+        self.MirrorDir = os.path.join(self.Workspace, "mirrors", "dotnet.git")
+        self.RootfsStore = os.path.join(self.Workspace, "rootfs")
+        self.DebCacheDir = os.path.join(self.Workspace, "deb-cache")
+        self.ToolchainStore = os.path.join(self.Workspace, "toolchains")
+        self.HistoryDb = os.path.join(self.Workspace, "history.db")
+
+        self.Jobs = []
+        self.InFlight = {}
+        self.PackagesInstalled = set()
+        self.Queue = queue.Queue()
+        self.Lock = threading.Lock()
+        self.MirrorLock = threading.Lock()
+        self.JobIds = itertools.count(1)
+
+        os.makedirs(self.JobsDir, exist_ok=True)
+
+    def serve_forever(self) -> None:
+        if os.path.exists(self.SocketPath):
+            # Only take over the socket of a service that is gone
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                try:
+                    probe.connect(self.SocketPath)
+                    print(f"Another bootstrap service is already listening on {self.SocketPath}")
+                    exit(-1)
+                except (ConnectionRefusedError, FileNotFoundError):
+                    pass
+            os.remove(self.SocketPath)
+        os.makedirs(os.path.dirname(os.path.abspath(self.SocketPath)), exist_ok=True)
+
+        for _ in range(self.MaxJobs):
+            threading.Thread(target=self._worker, daemon=True).start()
+
+        service = self
+
+        class Handler(socketserver.StreamRequestHandler):
+
+            def handle(self):
+                service._handle(self.rfile, self.wfile)
+
+        with socketserver.ThreadingUnixStreamServer(self.SocketPath, Handler) as server:
+            server.daemon_threads = True
+            print(f"Serving bootstrap jobs on {self.SocketPath} from {self.Workspace} "
+                  f"(up to {self.MaxJobs} concurrent jobs)")
+            server.serve_forever()
+
+    def submit(self, version: str, arch: str) -> Job:
+        if VERSION_PATTERN.match(version) is None:
+            raise ValueError(f"Unsupported .NET version '{version}'")
+        if arch not in SUPPORTED_ARCHS:
+            raise ValueError(f"Unsupported architecture '{arch}', expected one of {', '.join(SUPPORTED_ARCHS)}")
+
+        with self.Lock:
+            # Attach identical requests to the job already queued or running
+            job = self.InFlight.get((version, arch))
+            if job is not None:
+                return job
+
+            job = Job(next(self.JobIds), version, arch)
+            self.Jobs.append(job)
+            self.InFlight[(version, arch)] = job
+            job.emit("queued", version=version, arch=arch)
+            self.Queue.put(job)
+            return job
+
+    def _handle(self, rfile, wfile) -> None:
+        def send(message: dict):
+            wfile.write((json.dumps(message) + "\n").encode())
+            wfile.flush()
+
+        try:
+            line = rfile.readline()
+            if not line:
+                # Probed by another service checking whether this one is alive
+                return
+            request = json.loads(line)
+            if request.get("command") == "submit":
+                job = self.submit(str(request["version"]), str(request["arch"]))
+                for event in job.follow():
+                    send(event)
+            elif request.get("command") == "status":
+                with self.Lock:
+                    send({"jobs": [job.describe() for job in self.Jobs]})
+            else:
+                send({"error": f"Unknown command '{request.get('command')}'"})
+        except (ValueError, KeyError) as e:
+            send({"error": f"Invalid request: {e}"})
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away, the job keeps running
+            pass
+
+    def _worker(self) -> None:
+        while True:
+            job = self.Queue.get()
+            try:
+                job.State = "running"
+                job.emit("started")
+                exit_status = self._run_job(job)
+            except Exception as e:
+                job.emit("failed", message=f"Job failed: {e}")
+                exit_status = 1
+
+            with self.Lock:
+                job.State = "succeeded" if exit_status == 0 else "failed"
+                job.ExitStatus = exit_status
+                if exit_status == 0:
+                    self.PackagesInstalled.add(job.Arch)
+                del self.InFlight[(job.Version, job.Arch)]
+            job.emit("finished", exit_status=exit_status)
+
+    def _update_mirror(self, job: Job) -> None:
+        with self.MirrorLock:
+            if not os.path.exists(self.MirrorDir):
+                job.emit("output", line=f"Creating VMR mirror at {self.MirrorDir}")
+                os.makedirs(os.path.dirname(self.MirrorDir), exist_ok=True)
+                subprocess.run(["git", "init", "--bare", self.MirrorDir], check=True, capture_output=True)
+                subprocess.run(["git", "remote", "add", "origin", VMR_URL], cwd=self.MirrorDir, check=True,
+                               capture_output=True)
+            else:
+                job.emit("output", line=f"Updating VMR mirror at {self.MirrorDir}")
+
+            # Only branches and tags: a plain mirror clone of GitHub also fetches every refs/pull/*.
+            # Job clones borrow objects from the mirror, so it must never drop any: refs are not
+            # pruned and gc, which would delete objects no longer reachable from them, is disabled.
+            for key, value in [("remote.origin.fetch", "+refs/heads/*:refs/heads/*"),
+                               ("gc.auto", "0"),
+                               ("gc.pruneExpire", "never")]:
+                subprocess.run(["git", "config", "--replace-all", key, value], cwd=self.MirrorDir, check=True)
+            subprocess.run(["git", "config", "--add", "remote.origin.fetch", "+refs/tags/*:refs/tags/*"],
+                           cwd=self.MirrorDir, check=True)
+
+            retry(lambda: subprocess.run(["git", "fetch", "origin"], cwd=self.MirrorDir, check=True,
+                                         capture_output=True),
+                  3, "Updating the VMR mirror")
+
+    def _run_job(self, job: Job) -> int:
+        self._update_mirror(job)
+
+        command = [sys.executable, "-u", BOOTSTRAP_SCRIPT,
+                   "--version", job.Version,
+                   "--arch", job.Arch,
+                   "--working-dir", os.path.join(self.JobsDir, f"{job.Version}-{job.Arch}"),
+                   "--history-db", self.HistoryDb,
+                   "--deb-cache-dir", self.DebCacheDir,
+                   "--vmr-mirror", self.MirrorDir,
+                   "--rootfs-store", self.RootfsStore,
+                   "--toolchain-store", self.ToolchainStore] + self.BootstrapArgs
+        with self.Lock:
+            if job.Arch in self.PackagesInstalled:
+                command.append("--skip-package-install")
+
+        # Each bootstrap runs in its own process, so a failing or stalled build can't take
+        # down the service and its output can be streamed to the clients following the job
+        process = subprocess.Popen(command, cwd=os.path.dirname(BOOTSTRAP_SCRIPT), stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT, text=True, errors="replace")
+        for line in process.stdout:
+            job.emit("output", line=line.rstrip("\n"))
+        return process.wait()
@@ -0,0 +1,152 @@
+import os
+import re
+import subprocess
+import tempfile
+
+# Number of projects and targets listed in each section of a report
+TOP_ENTRIES = 15
+
+# "    12345 ms  /src/runtime/src/libraries/System.Private.CoreLib.csproj   3 calls"
+PERFORMANCE_LINE = re.compile(r'^\s*(\d+) ms\s+(.+?)\s+(\d+) calls\s*$')
+TIMESTAMP = re.compile(r'^(\d\d):(\d\d):(\d\d)\.(\d+)\s+')
+# Project "a.proj" (1) is building "b.csproj" (2:3) on node 1 (default targets).
+PROJECT_REFERENCE = re.compile(r'Project "[^"]+" \((\d+)(?::\d+)?\) is building "([^"]+)" \((\d+)(?::\d+)?\)')
+# 1>Project "a.proj" on node 1 (Build target(s)).
+PROJECT_STARTED = re.compile(r'(\d+)(?::\d+)?>Project "([^"]+)" on node')
+# 2>Done Building Project "b.csproj" (default targets).
+PROJECT_FINISHED = re.compile(r'(\d+)(?::\d+)?>Done Building Project "([^"]+)"')
+
+
+class ProjectRun:
+
+    def __init__(self, path: str, parent: int | None, start: float):
+        self.Path = path
+        self.Parent = parent
+        self.Start = start
+        self.End = start
+        self.Children = []
+
+
+def replay_binlog(dotnet: str, binlog: str, temp_dir: str) -> str:
+    # Replaying a binlog through the text logger recovers the project timeline and the performance summary.
+    # The replay of a large build runs to gigabytes, so it is written next to the binlogs rather than to /tmp.
+    fd, replay_log = tempfile.mkstemp(suffix=".log", dir=temp_dir)
+    os.close(fd)
+    try:
+        subprocess.run([dotnet, "msbuild", binlog, "-noConsoleLogger", "-fileLogger",
+                        f"-fileLoggerParameters:LogFile={replay_log};Verbosity=normal;"
+                        "ShowTimestamp;PerformanceSummary"],
+                       check=True, capture_output=True)
+    except subprocess.CalledProcessError:
+        os.remove(replay_log)
+        raise
+    return replay_log
+
+
+def parse_performance_summary(lines) -> tuple[dict[str, int], dict[str, int]]:
+    # Elapsed milliseconds per project file and per target name
+    projects = {}
+    targets = {}
+    section = None
+    for line in lines:
+        line = TIMESTAMP.sub("", line.rstrip("\r\n"))
+        if line.startswith("Project Performance Summary:"):
+            section = projects
+        elif line.startswith("Target Performance Summary:"):
+            section = targets
+        elif line.endswith("Performance Summary:"):
+            section = None
+        elif section is not None and (match := PERFORMANCE_LINE.match(line)) is not None:
+            name = match.group(2)
+            # The project section also lists the targets each project was built with
+            if section is projects and not os.path.isabs(name):
+                continue
+            section[name] = section.get(name, 0) + int(match.group(1))
+    return projects, targets
+
+
+def parse_project_timeline(lines) -> dict[int, ProjectRun]:
+    runs = {}
+    day = 0
+    previous = None
+    for line in lines:
+        match = TIMESTAMP.match(line)
+        if match is None:
+            continue
+        hours, minutes, seconds, fraction = match.groups()
+        timestamp = int(hours) * 3600 + int(minutes) * 60 + int(seconds) + float("0." + fraction)
+        # Timestamps only carry the time of day
+        if previous is not None and timestamp + day < previous - 12 * 3600:
+            day += 24 * 3600
+        timestamp += day
+        previous = timestamp
+
+        if (match := PROJECT_REFERENCE.search(line)) is not None:
+            parent, path, project_id = int(match.group(1)), match.group(2), int(match.group(3))
+            if project_id not in runs:
+                runs[project_id] = ProjectRun(path, parent, timestamp)
+                if parent in runs and parent != project_id:
+                    runs[parent].Children.append(project_id)
+        elif (match := PROJECT_STARTED.search(line)) is not None:
+            project_id = int(match.group(1))
+            if project_id not in runs:
+                runs[project_id] = ProjectRun(match.group(2), None, timestamp)
+        elif (match := PROJECT_FINISHED.search(line)) is not None:
+            project_id = int(match.group(1))
+            if project_id in runs:
+                runs[project_id].End = timestamp
+    return runs
+
+
+def critical_path(runs: dict[int, ProjectRun]) -> list[tuple[str, float]]:
+    # Follow the child that finished last from each root, charging each project the time
+    # it spent on the path outside of that child
+    contributions = {}
+    for run in runs.values():
+        if run.Parent is not None and run.Parent in runs:
+            continue
+        while run is not None:
+            last_child = max((runs[child] for child in run.Children), key=lambda child: child.End, default=None)
+            own_time = run.End - run.Start
+            if last_child is not None:
+                own_time -= last_child.End - last_child.Start
+            contributions[run.Path] = contributions.get(run.Path, 0) + max(own_time, 0)
+            run = last_child
+    return sorted(contributions.items(), key=lambda item: item[1], reverse=True)
+
+
+def write_binlog_report(stage: str, binlogs: list[str], dotnet: str, report_path: str) -> list[str]:
+    projects = {}
+    targets = {}
+    path_contributions = {}
+    for binlog in binlogs:
+        replay_log = replay_binlog(dotnet, binlog, os.path.dirname(os.path.abspath(report_path)))
+        try:
+            # Stream the replay through each parser instead of holding it in memory
+            with open(replay_log, 'r', errors="replace") as file:
+                binlog_projects, binlog_targets = parse_performance_summary(file)
+            with open(replay_log, 'r', errors="replace") as file:
+                timeline = parse_project_timeline(file)
+        finally:
+            os.remove(replay_log)
+
+        for name, elapsed in binlog_projects.items():
+            projects[name] = projects.get(name, 0) + elapsed
+        for name, elapsed in binlog_targets.items():
+            targets[name] = targets.get(name, 0) + elapsed
+        for name, seconds in critical_path(timeline):
+            path_contributions[name] = path_contributions.get(name, 0) + seconds
+
+    report = [f"{stage}: {len(binlogs)} binary logs", "", "Slowest projects (inclusive elapsed time):"]
+    for name, elapsed in sorted(projects.items(), key=lambda item: item[1], reverse=True)[:TOP_ENTRIES]:
+        report.append(f"  {elapsed / 1000:10.1f}s  {name}")
+    report += ["", "Slowest targets (elapsed time across all projects):"]
+    for name, elapsed in sorted(targets.items(), key=lambda item: item[1], reverse=True)[:TOP_ENTRIES]:
+        report.append(f"  {elapsed / 1000:10.1f}s  {name}")
+    report += ["", "Critical path contribution (time on the longest project chain):"]
+    for name, seconds in sorted(path_contributions.items(), key=lambda item: item[1], reverse=True)[:TOP_ENTRIES]:
+        report.append(f"  {seconds:10.1f}s  {name}")
+
+    with open(report_path, 'w') as file:
+        file.write('\n'.join(report) + '\n')
+    return report
@@ -0,0 +1,196 @@
+import fcntl
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import shutil
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+# Request headers forwarded upstream for requests that are not cached
+FORWARDED_HEADERS = ["If-Modified-Since", "If-None-Match", "Range", "User-Agent"]
+# Response headers forwarded back to apt/debootstrap
+RETURNED_HEADERS = ["Content-Type", "Content-Length", "Content-Range", "Last-Modified", "ETag"]
+
+CHUNK_SIZE = 1024 * 1024
+# Seconds after which a download that is still incomplete is considered abandoned
+PARTIAL_MAX_AGE = 24 * 3600
+
+
+# A small caching HTTP proxy shared by host apt and debootstrap.
+# Packages (.deb/.udeb) are immutable for a given file name, so they are stored in the
+# cache directory and served from disk on later requests, whichever mirror they came from.
+# Everything else (Release files, package indices) is passed through uncached. Once the
+# cache grows past its size cap, the least recently used packages are evicted, and packages
+# that haven't been used for longer than the maximum age are dropped so a bad or superseded
+# download can't be served forever.
+# Several bootstraps may share a cache directory, each with its own proxy, so packages can
+# disappear at any time: a package that can't be opened is fetched again.
+class DebCacheProxy:
+
+    def __init__(self, cache_dir: str, max_size: int, max_age: int):
+        self.CacheDir = os.path.abspath(cache_dir)
+        self.MaxSize = max_size
+        self.MaxAge = max_age
+        self.Hits = 0
+        self.Misses = 0
+        self.Lock = threading.Lock()
+        self.Server = None
+
+        os.makedirs(self.CacheDir, exist_ok=True)
+
+    def start(self) -> str:
+        self._evict()
+        proxy = self
+
+        class Handler(DebCacheRequestHandler):
+            Proxy = proxy
+
+        self.Server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.Server.daemon_threads = True
+        threading.Thread(target=self.Server.serve_forever, daemon=True).start()
+
+        print(f"Serving .deb cache from {self.CacheDir} at {self.url()}")
+        return self.url()
+
+    def stop(self) -> None:
+        if self.Server is None:
+            return
+        self.Server.shutdown()
+        self.Server.server_close()
+        self.Server = None
+        print(f".deb cache: {self.Hits} hits, {self.Misses} misses")
+
+    def url(self) -> str:
+        host, port = self.Server.server_address
+        return f"http://{host}:{port}/"
+
+    def cache_path(self, url: str) -> str | None:
+        file_name = os.path.basename(urllib.parse.unquote(urllib.parse.urlparse(url).path))
+        if not file_name.endswith((".deb", ".udeb")):
+            return None
+        return os.path.join(self.CacheDir, file_name)
+
+    def store(self, temp_path: str, cache_path: str) -> None:
+        os.replace(temp_path, cache_path)
+        with self.Lock:
+            self.Misses += 1
+            self._evict()
+
+    def _evict(self) -> None:
+        # Only one of the proxies sharing the cache directory evicts at a time
+        with open(os.path.join(self.CacheDir, ".lock"), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            entries = []
+            now = time.time()
+            for entry in os.scandir(self.CacheDir):
+                if not entry.is_file() or not entry.name.endswith((".deb", ".udeb", ".partial")):
+                    continue
+                try:
+                    stat = entry.stat()
+                    if entry.name.endswith(".partial"):
+                        # Left behind by a proxy that was killed mid-download
+                        if stat.st_mtime < now - PARTIAL_MAX_AGE:
+                            os.remove(entry.path)
+                    elif stat.st_mtime < now - self.MaxAge:
+                        os.remove(entry.path)
+                    else:
+                        entries.append((entry.path, stat))
+                except FileNotFoundError:
+                    continue
+
+            total_size = sum(stat.st_size for _, stat in entries)
+            for path, stat in sorted(entries, key=lambda entry: entry[1].st_mtime):
+                if total_size <= self.MaxSize:
+                    break
+                total_size -= stat.st_size
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+
+class DebCacheRequestHandler(BaseHTTPRequestHandler):
+    Proxy: DebCacheProxy
+
+    def do_GET(self):
+        if not self.path.startswith("http://"):
+            self.send_error(400, "Only absolute http:// URLs can be proxied")
+            return
+
+        cache_path = self.Proxy.cache_path(self.path)
+        if cache_path is not None:
+            # Once open, the package can be served even if another proxy evicts it meanwhile
+            try:
+                file = open(cache_path, 'rb')
+            except FileNotFoundError:
+                file = None
+            if file is not None:
+                with file:
+                    self._send_cached(file)
+                return
+        self._send_upstream(cache_path)
+
+    def _send_cached(self, file) -> None:
+        with self.Proxy.Lock:
+            self.Proxy.Hits += 1
+        # Refresh the modification time so eviction treats it as recently used
+        os.utime(file.fileno())
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/vnd.debian.binary-package")
+        self.send_header("Content-Length", str(os.fstat(file.fileno()).st_size))
+        self.end_headers()
+        shutil.copyfileobj(file, self.wfile, CHUNK_SIZE)
+
+    def _send_upstream(self, cache_path: str | None) -> None:
+        headers = {name: self.headers[name] for name in FORWARDED_HEADERS if name in self.headers}
+        if cache_path is not None:
+            # Always fetch whole packages so they can be cached
+            headers.pop("Range", None)
+
+        try:
+            response = urllib.request.urlopen(urllib.request.Request(self.path, headers=headers), timeout=120)
+        except urllib.error.HTTPError as e:
+            self.send_response(e.code)
+            for name in RETURNED_HEADERS:
+                if name in e.headers:
+                    self.send_header(name, e.headers[name])
+            self.end_headers()
+            shutil.copyfileobj(e, self.wfile, CHUNK_SIZE)
+            return
+        except (urllib.error.URLError, OSError) as e:
+            self.send_error(502, f"Upstream request failed: {e}")
+            return
+
+        with response:
+            self.send_response(response.status)
+            for name in RETURNED_HEADERS:
+                if name in response.headers:
+                    self.send_header(name, response.headers[name])
+            self.end_headers()
+
+            if cache_path is None or response.status != 200:
+                shutil.copyfileobj(response, self.wfile, CHUNK_SIZE)
+                return
+
+            # Stream the package to the client while writing it to the cache
+            fd, temp_path = tempfile.mkstemp(".partial", dir=self.Proxy.CacheDir)
+            try:
+                with os.fdopen(fd, 'wb') as cache_file:
+                    while chunk := response.read(CHUNK_SIZE):
+                        cache_file.write(chunk)
+                        self.wfile.write(chunk)
+
+                expected_size = response.headers.get("Content-Length")
+                if expected_size is None or os.path.getsize(temp_path) == int(expected_size):
+                    self.Proxy.store(temp_path, cache_path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+
+    def log_message(self, format, *args):
+        # apt fetches thousands of files; don't log every request
+        pass
@@ -1,26 +1,27 @@
 import glob
-import re
+import os
 import shutil
 
 
-def replace_in_file(input_file: str, pattern: str, replacement: str) -> str:
-    try:
-        with open(input_file, 'r') as file:
-            content = file.read()
-        
-        # Perform the replacement
-        updated_content = re.sub(pattern, replacement, content)
-        
-        print(f"Replaced '{pattern}' with '{replacement}'")
-        return updated_content
-    
-    except FileNotFoundError:
-        print(f"File '{input_file}' not found.")
-    except IOError as e:
-        print(f"An error occurred: {e}")
-
 def copy_files(pattern, destination) -> None:
     print(f"Using pattern '{pattern}'")
     for file_path in glob.glob(pattern):
         print(f"Copying {file_path} to {destination}")
         shutil.copy(file_path, destination)
+
+def link_or_copy(source: str, destination: str) -> None:
+    if os.path.exists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        # Hardlinks don't work across filesystems
+        shutil.copy(source, destination)
+
+def remove_directory(path: str) -> None:
+    # Refuse to delete anything mounted below the directory, such as /proc or /dev bound into a chroot
+    for root, dirs, _ in os.walk(path):
+        for directory in dirs:
+            if os.path.ismount(os.path.join(root, directory)):
+                raise OSError(f"Cannot remove '{path}', '{os.path.join(root, directory)}' is a mount point")
+    shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,227 @@
+from contextlib import contextmanager
+import os
+import socket
+import sqlite3
+import time
+
+DEFAULT_HISTORY_DB = os.path.expanduser("~/.local/share/dotnet-bootstrap/history.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    version TEXT NOT NULL,
+    arch TEXT NOT NULL,
+    host TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    duration REAL NOT NULL,
+    exit_status INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stages (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    duration REAL NOT NULL,
+    succeeded INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cache_hits (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    stage TEXT,
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stalls (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    stage TEXT,
+    command TEXT NOT NULL,
+    report_path TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS failures (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    stage TEXT,
+    command TEXT NOT NULL,
+    log_path TEXT NOT NULL,
+    tail TEXT NOT NULL,
+    errors TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS artifacts (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL
+);
+"""
+
+
+class RunRecord:
+
+    def __init__(self, version: str, arch: str):
+        self.Version = version
+        self.Arch = arch
+        self.Host = socket.gethostname()
+        self.StartedAt = time.time()
+        self.Stages = []
+        self.CacheHits = []
+        self.Artifacts = []
+        self.Stalls = []
+        self.Failures = []
+        self.CurrentStage = None
+
+    @contextmanager
+    def stage(self, name: str):
+        self.CurrentStage = name
+        start = time.monotonic()
+        succeeded = False
+        try:
+            yield
+            succeeded = True
+        finally:
+            self.Stages.append((name, time.monotonic() - start, succeeded))
+            self.CurrentStage = None
+
+    def cache_hit(self, name: str) -> None:
+        self.CacheHits.append((self.CurrentStage, name))
+
+    def stall(self, command: list[str], report_path: str) -> None:
+        self.Stalls.append((self.CurrentStage, ' '.join(command), report_path))
+
+    def failure(self, command: list[str], log_path: str, tail: list[str], errors: list[str]) -> None:
+        self.Failures.append((self.CurrentStage, ' '.join(command), log_path, tail, errors))
+
+    def record_artifacts(self, directory: str) -> None:
+        for root, _, files in os.walk(directory):
+            for file in files:
+                file_path = os.path.join(root, file)
+                self.Artifacts.append((file_path, os.path.getsize(file_path)))
+
+
+class RunHistory:
+
+    def __init__(self, db_path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.Connection = sqlite3.connect(db_path)
+        self.Connection.executescript(SCHEMA)
+
+    def save(self, record: RunRecord, exit_status: int) -> int:
+        with self.Connection:
+            cursor = self.Connection.execute(
+                "INSERT INTO runs (version, arch, host, started_at, duration, exit_status) VALUES (?, ?, ?, ?, ?, ?)",
+                (record.Version, record.Arch, record.Host, record.StartedAt,
+                 time.time() - record.StartedAt, exit_status))
+            run_id = cursor.lastrowid
+            self.Connection.executemany(
+                "INSERT INTO stages (run_id, position, name, duration, succeeded) VALUES (?, ?, ?, ?, ?)",
+                [(run_id, position, name, duration, int(succeeded))
+                 for position, (name, duration, succeeded) in enumerate(record.Stages)])
+            self.Connection.executemany(
+                "INSERT INTO cache_hits (run_id, stage, name) VALUES (?, ?, ?)",
+                [(run_id, stage, name) for stage, name in record.CacheHits])
+            self.Connection.executemany(
+                "INSERT INTO stalls (run_id, stage, command, report_path) VALUES (?, ?, ?, ?)",
+                [(run_id, stage, command, report_path) for stage, command, report_path in record.Stalls])
+            self.Connection.executemany(
+                "INSERT INTO failures (run_id, stage, command, log_path, tail, errors) VALUES (?, ?, ?, ?, ?, ?)",
+                [(run_id, stage, command, log_path, '\n'.join(tail), '\n'.join(errors))
+                 for stage, command, log_path, tail, errors in record.Failures])
+            self.Connection.executemany(
+                "INSERT INTO artifacts (run_id, path, size) VALUES (?, ?, ?)",
+                [(run_id, path, size) for path, size in record.Artifacts])
+        return run_id
+
+    def runs(self, version: str | None = None, arch: str | None = None) -> list[tuple]:
+        query = ("SELECT id, version, arch, host, started_at, duration, exit_status, "
+                 "(SELECT COUNT(*) FROM stalls WHERE stalls.run_id = runs.id), "
+                 "(SELECT log_path FROM failures WHERE failures.run_id = runs.id ORDER BY rowid DESC LIMIT 1) "
+                 "FROM runs WHERE 1 = 1")
+        params = []
+        if version is not None:
+            query += " AND version = ?"
+            params.append(version)
+        if arch is not None:
+            query += " AND arch = ?"
+            params.append(arch)
+        return self.Connection.execute(query + " ORDER BY started_at", params).fetchall()
+
+    def stage_trends(self, version: str | None = None, arch: str | None = None,
+                     stage: str | None = None) -> dict[tuple[str, str, str], list[tuple]]:
+        # Successful stage durations per (major version, arch, stage), oldest run first.
+        # Builds of different major versions differ too much to be compared with each other.
+        query = ("SELECT runs.arch, stages.name, runs.id, runs.version, stages.duration, "
+                 "(SELECT COUNT(*) FROM cache_hits WHERE cache_hits.run_id = runs.id "
+                 "AND cache_hits.stage = stages.name), "
+                 "(SELECT COALESCE(SUM(size), 0) FROM artifacts WHERE artifacts.run_id = runs.id) "
+                 "FROM stages JOIN runs ON runs.id = stages.run_id WHERE stages.succeeded = 1")
+        params = []
+        if version is not None:
+            query += " AND runs.version = ?"
+            params.append(version)
+        if arch is not None:
+            query += " AND runs.arch = ?"
+            params.append(arch)
+        if stage is not None:
+            query += " AND stages.name = ?"
+            params.append(stage)
+
+        trends = {}
+        for row in self.Connection.execute(query + " ORDER BY runs.started_at, stages.position", params):
+            major_version = row[3].split('.')[0]
+            trends.setdefault((major_version, row[0], row[1]), []).append(row[2:])
+        return trends
+
+    def regressions(self, threshold: float, version: str | None = None, arch: str | None = None,
+                    stage: str | None = None) -> list[str]:
+        regressions = []
+        for (_, arch_name, stage_name), samples in self.stage_trends(version, arch, stage).items():
+            for previous, current in zip(samples, samples[1:]):
+                previous_duration, current_duration = previous[2], current[2]
+                if previous_duration <= 0:
+                    continue
+                change = (current_duration - previous_duration) / previous_duration
+                if change > threshold:
+                    regressions.append(
+                        f"{stage_name} build for {arch_name} got {change:.0%} slower between "
+                        f"{previous[1]} (run {previous[0]}) and {current[1]} (run {current[0]})")
+        return regressions
+
+
+def format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m{seconds:02d}s"
+
+
+def print_history(history: RunHistory, version: str | None, arch: str | None,
+                  stage: str | None, threshold: float) -> None:
+    print("-----------------------------------")
+    print("Runs")
+    print("-----------------------------------")
+    for (run_id, run_version, run_arch, host, started_at, duration, exit_status, stalls,
+         failure_log) in history.runs(version, arch):
+        started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(started_at))
+        status = "ok" if exit_status == 0 else f"failed ({exit_status})"
+        if stalls > 0:
+            status += f", {stalls} stalled commands"
+        if exit_status != 0 and failure_log is not None:
+            status += f", see {failure_log}"
+        print(f"#{run_id:<5} {started}  {run_version:<10} {run_arch:<8} {host:<20} "
+              f"{format_duration(duration)}  {status}")
+
+    print("-----------------------------------")
+    print("Stage trends")
+    print("-----------------------------------")
+    for (major_version, arch_name, stage_name), samples in history.stage_trends(version, arch, stage).items():
+        print(f"{stage_name} ({major_version}.x, {arch_name}):")
+        previous_duration = None
+        for run_id, run_version, duration, cache_hits, artifacts_size in samples:
+            change = ""
+            if previous_duration:
+                change = f" ({(duration - previous_duration) / previous_duration:+.0%})"
+            print(f"  #{run_id:<5} {run_version:<10} {format_duration(duration)}{change}"
+                  f"  cache hits: {cache_hits}  run artifacts: {artifacts_size / 1024 ** 2:.1f} MiB")
+            previous_duration = duration
+
+    print("-----------------------------------")
+    print(f"Regressions (slower by more than {threshold:.0%})")
+    print("-----------------------------------")
+    regressions = history.regressions(threshold, version, arch, stage)
+    for regression in regressions:
+        print(regression)
+    if len(regressions) == 0:
+        print("No regressions found.")
@@ -0,0 +1,89 @@
+import collections
+import gzip
+import os
+import re
+import threading
+import time
+
+# Minimum number of seconds between two progress lines on the console
+PROGRESS_INTERVAL = 30
+# Number of output lines kept in memory for failure summaries
+TAIL_LINES = 200
+# Number of lines of a failed command shown in its failure summary
+FAILURE_TAIL_LINES = 50
+# Maximum number of distinct error lines kept per command
+MAX_ERROR_LINES = 100
+
+# MSBuild/compiler diagnostics ("file(1,2): error CS0246: ..."), make and shell errors
+ERROR_LINE = re.compile(r'\berror\b(\s+[A-Z]+\d+)?\s*:|^\s*make(\[\d+\])?: \*\*\*|^Build FAILED', re.IGNORECASE)
+
+
+class StageLog:
+
+    def __init__(self, path: str, stage: str, command: list[str], console_output: bool = False):
+        # Every command appends its own gzip member, so a stage's log reads as one file
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.Path = path
+        self.Stage = stage
+        self.ConsoleOutput = console_output
+        self.File = gzip.open(path, 'ab')
+        self.Lock = threading.Lock()
+        self.LineCount = 0
+        self.Tail = collections.deque(maxlen=TAIL_LINES)
+        self.Errors = {}
+        self.LastProgress = time.monotonic()
+
+        self.File.write(f"$ {' '.join(command)}\n".encode())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def write(self, chunk: bytes, lines: list[str]) -> None:
+        with self.Lock:
+            if self.File is None:
+                # Output of processes that outlived the command
+                return
+            self.File.write(chunk)
+
+            self.LineCount += len(lines)
+            self.Tail.extend(lines)
+            for line in lines:
+                if len(self.Errors) < MAX_ERROR_LINES and ERROR_LINE.search(line):
+                    # MSBuild repeats every error in its final summary
+                    self.Errors.setdefault(line.strip(), None)
+
+            now = time.monotonic()
+            if not self.ConsoleOutput and now - self.LastProgress >= PROGRESS_INTERVAL and len(self.Tail) > 0:
+                self.LastProgress = now
+                last_line = self.Tail[-1].strip()
+                print(f"[{self.Stage}] {self.LineCount} lines, {len(self.Errors)} errors: {last_line[:120]}",
+                      flush=True)
+
+    def close(self) -> None:
+        with self.Lock:
+            if self.File is not None:
+                self.File.close()
+                self.File = None
+
+    def failure_summary(self) -> tuple[list[str], list[str]]:
+        with self.Lock:
+            return list(self.Tail)[-FAILURE_TAIL_LINES:], list(self.Errors)
+
+
+def print_failure(stage: str, command: str, log_path: str, tail: list[str], errors: list[str]) -> None:
+    print("-----------------------------------")
+    print(f"Stage {stage} failed running: {command}")
+    print(f"Full log: {log_path}")
+    print("-----------------------------------")
+    if len(errors) > 0:
+        print(f"{len(errors)} error lines:")
+        for line in errors:
+            print(f"  {line}")
+        print("-----------------------------------")
+    print(f"Last {len(tail)} lines of output:")
+    for line in tail:
+        print(line)
+    print("-----------------------------------")
@@ -0,0 +1,99 @@
+import base64
+import glob
+import hashlib
+import json
+import os
+import xml.etree.ElementTree as ElementTree
+import zipfile
+
+from src.utils.files import link_or_copy
+
+FEED_INDEX_FILE = "index.json"
+
+
+def read_nuspec(nupkg_path: str) -> tuple[str, str, bytes]:
+    with zipfile.ZipFile(nupkg_path) as nupkg:
+        nuspec_names = [name for name in nupkg.namelist() if name.endswith(".nuspec") and '/' not in name]
+        if len(nuspec_names) != 1:
+            raise ValueError(f"Expected one nuspec at the root of '{nupkg_path}', found {len(nuspec_names)}")
+        nuspec = nupkg.read(nuspec_names[0])
+
+    # Match the metadata tags regardless of the nuspec schema namespace
+    metadata = {}
+    for element in ElementTree.fromstring(nuspec).iter():
+        tag = element.tag.split('}')[-1]
+        if tag in ("id", "version") and tag not in metadata:
+            metadata[tag] = (element.text or "").strip()
+
+    if not metadata.get("id") or not metadata.get("version"):
+        raise ValueError(f"Could not read the package id and version from '{nupkg_path}'")
+
+    return metadata["id"], metadata["version"], nuspec
+
+
+def normalize_version(version: str) -> str:
+    # Follows NuGet's version normalization: build metadata is dropped, leading zeros are
+    # removed, there are at least three version parts and a fourth part is only kept if not zero
+    version = version.split('+')[0].lower()
+    release, _, prerelease = version.partition('-')
+    parts = [str(int(part)) for part in release.split('.')]
+    while len(parts) < 3:
+        parts.append("0")
+    if len(parts) == 4 and parts[3] == "0":
+        parts = parts[:3]
+
+    normalized = '.'.join(parts)
+    if prerelease:
+        normalized += '-' + prerelease
+    return normalized
+
+
+def add_package_to_feed(nupkg_path: str, feed_dir: str) -> None:
+    package_id, version, nuspec = read_nuspec(nupkg_path)
+    package_id = package_id.lower()
+    version = normalize_version(version)
+
+    # Use the v3 folder layout: <id>/<version>/<id>.<version>.nupkg, next to the
+    # package hash and its nuspec, so NuGet does not have to open every package
+    package_dir = os.path.join(feed_dir, package_id, version)
+    os.makedirs(package_dir, exist_ok=True)
+
+    destination = os.path.join(package_dir, f"{package_id}.{version}.nupkg")
+    print(f"Adding {nupkg_path} to {package_dir}")
+    link_or_copy(nupkg_path, destination)
+
+    sha512 = hashlib.sha512()
+    with open(destination, 'rb') as file:
+        while chunk := file.read(1024 * 1024):
+            sha512.update(chunk)
+    with open(destination + ".sha512", 'w') as file:
+        file.write(base64.b64encode(sha512.digest()).decode())
+
+    with open(os.path.join(package_dir, f"{package_id}.nuspec"), 'wb') as file:
+        file.write(nuspec)
+
+
+def add_packages_to_feed(pattern: str, feed_dir: str) -> None:
+    print(f"Using pattern '{pattern}'")
+
+    # NuGet treats a folder with packages at its root as a flat feed, so move any
+    # packages left there by previous runs into the hierarchical layout
+    for file_path in glob.glob(os.path.join(feed_dir, "*.nupkg")):
+        add_package_to_feed(file_path, feed_dir)
+        os.remove(file_path)
+
+    for file_path in glob.glob(pattern):
+        add_package_to_feed(file_path, feed_dir)
+
+    update_feed_index(feed_dir)
+
+
+def update_feed_index(feed_dir: str) -> None:
+    index = {}
+    for package_id in sorted(os.listdir(feed_dir)):
+        package_path = os.path.join(feed_dir, package_id)
+        if os.path.isdir(package_path):
+            index[package_id] = sorted(os.listdir(package_path))
+
+    with open(os.path.join(feed_dir, FEED_INDEX_FILE), 'w') as file:
+        json.dump(index, file, indent=2)
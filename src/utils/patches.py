@@ -1,32 +1,251 @@
 import os
-import subprocess
+import re
 import tempfile
 
+# Maximum number of context lines ignored at each end of a hunk that doesn't match exactly
+MAX_FUZZ = 2
 
-def apply_patch(patch_content: str, target_file: str):
-    # Save the patch content to a temporary file
-    patch_file = tempfile.mktemp(".patch")
-    with open(patch_file, 'w') as f:
-        f.write(patch_content)
-    
-    try:
-        # Apply the patch using the `patch` command
-        result = subprocess.run(['patch', '--verbose', target_file, '-i', patch_file],
-                                check=True, text=True, capture_output=True)
-        print("Patch applied successfully.")
-    except subprocess.CalledProcessError as e:
-        print("Error applying patch")
-        print(e.stdout) if len(str(e.stdout)) > 0 else None
-        print(e.stderr) if len(str(e.stderr)) > 0 else None
-        exit(-1)
-    finally:
-        # Clean up the temporary patch file
-        os.remove(patch_file)
-
-def extract_file_path_from_patch(patch_content: str) -> str:
-    # Split the patch content into lines
-    lines = patch_content.splitlines()
-    
-    for line in lines:
-        if line.startswith('+++ '):
-            return line[4:].strip().split('\t')[0]
+HUNK_HEADER = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+
+class PatchError(Exception):
+    pass
+
+
+class Hunk:
+
+    def __init__(self, old_start: int):
+        self.OldStart = old_start
+        # (operation, text) tuples, operation being ' ', '-' or '+'
+        self.Lines = []
+        # Set by "\ No newline at end of file" after the last line of the new side
+        self.NewNoNewline = False
+
+    def old_lines(self, fuzz: int = 0) -> list[str]:
+        return self._side(' -', fuzz)
+
+    def new_lines(self, fuzz: int = 0) -> list[str]:
+        return self._side(' +', fuzz)
+
+    def leading_context(self, fuzz: int) -> int:
+        return min(fuzz, self._context_length(self.Lines))
+
+    def trailing_context(self, fuzz: int) -> int:
+        return min(fuzz, self._context_length(reversed(self.Lines)))
+
+    def _side(self, operations: str, fuzz: int) -> list[str]:
+        lines = self.Lines[self.leading_context(fuzz):len(self.Lines) - self.trailing_context(fuzz)]
+        return [text for operation, text in lines if operation in operations]
+
+    @staticmethod
+    def _context_length(lines) -> int:
+        length = 0
+        for operation, _ in lines:
+            if operation != ' ':
+                break
+            length += 1
+        return length
+
+
+class FilePatch:
+
+    def __init__(self, source: str, path: str):
+        self.Source = source
+        self.Path = path
+        self.Hunks = []
+
+
+def parse_patch(content: str, source: str) -> list[FilePatch]:
+    file_patches = []
+    hunk = None
+    old_remaining = new_remaining = 0
+    for line in content.splitlines():
+        if line.startswith('\\'):
+            # "\ No newline at end of file" applies to the line before it
+            if hunk is not None and len(hunk.Lines) > 0 and hunk.Lines[-1][0] in ' +':
+                hunk.NewNoNewline = True
+            continue
+        if old_remaining > 0 or new_remaining > 0:
+            # Some editors strip the single space of empty context lines
+            operation = line[:1] or ' '
+            if operation not in ' -+':
+                raise PatchError(f"{source}: malformed hunk at line {hunk.OldStart} of {file_patches[-1].Path}")
+            hunk.Lines.append((operation, line[1:]))
+            old_remaining -= operation in ' -'
+            new_remaining -= operation in ' +'
+            if old_remaining < 0 or new_remaining < 0:
+                raise PatchError(f"{source}: malformed hunk at line {hunk.OldStart} of {file_patches[-1].Path}")
+        elif line.startswith('+++ '):
+            file_patches.append(FilePatch(source, line[4:].strip().split('\t')[0]))
+        elif (match := HUNK_HEADER.match(line)) is not None:
+            if len(file_patches) == 0:
+                raise PatchError(f"{source}: hunk found before any file header")
+            hunk = Hunk(int(match.group(1)))
+            old_remaining = int(match.group(2) if match.group(2) is not None else 1)
+            new_remaining = int(match.group(4) if match.group(4) is not None else 1)
+            file_patches[-1].Hunks.append(hunk)
+
+    if old_remaining > 0 or new_remaining > 0:
+        raise PatchError(f"{source}: patch ends in the middle of a hunk")
+
+    return file_patches
+
+
+def _find(lines: list[str], block: list[str], expected: int) -> int | None:
+    # Search outwards from the expected position, like patch(1) does
+    limit = len(lines) - len(block)
+    for distance in range(0, max(expected, limit - expected) + 1):
+        for position in (expected - distance, expected + distance):
+            if 0 <= position <= limit and lines[position:position + len(block)] == block:
+                return position
+    return None
+
+
+def _matches_template(lines: list[str], template: list[str], placeholders: list[str]) -> bool:
+    # Whether the lines appear in the file with any values in place of the placeholders
+    pattern = '|'.join(re.escape(placeholder) for placeholder in placeholders)
+    expressions = [re.compile('.*'.join(re.escape(part) for part in re.split(pattern, line)) + '$')
+                   for line in template]
+    for position in range(0, len(lines) - len(expressions) + 1):
+        if all(expression.match(line) for expression, line in zip(expressions, lines[position:])):
+            return True
+    return False
+
+
+def applied_with_other_values(content: str, template: FilePatch, placeholders: list[str]) -> bool:
+    # A hunk that sets a placeholder doesn't match once the file was patched with another value,
+    # e.g. a path in a different working directory
+    lines = [line.rstrip("\r\n") for line in content.splitlines()]
+    for hunk in template.Hunks:
+        added = [text for operation, text in hunk.Lines if operation == '+']
+        if any(placeholder in line for line in added for placeholder in placeholders) and \
+                _matches_template(lines, hunk.new_lines(), placeholders):
+            return True
+    return False
+
+
+def apply_hunks(content: str, file_patch: FilePatch) -> tuple[str, list[str]]:
+    lines = content.splitlines(keepends=True)
+    eol = "\r\n" if len(lines) > 0 and lines[0].endswith("\r\n") else "\n"
+    stripped = [line.rstrip("\r\n") for line in lines]
+
+    report = []
+    offset = 0
+    for index, hunk in enumerate(file_patch.Hunks, start=1):
+        expected = hunk.OldStart - 1 + offset
+
+        # The old side can still match once a hunk is applied, e.g. when it only adds lines after
+        # its context, so a hunk counts as applied when its new side is the closer match
+        position = applied_position = None
+        for fuzz in range(0, MAX_FUZZ + 1):
+            anchor = expected + hunk.leading_context(fuzz)
+            old = hunk.old_lines(fuzz)
+            new = hunk.new_lines(fuzz)
+            if fuzz > 0 and (len(old) == 0 or len(new) == 0):
+                # Nothing left to anchor the hunk with
+                break
+            position = _find(stripped, old, anchor)
+            applied_position = _find(stripped, new, anchor) if len(new) > 0 else None
+            if applied_position is not None and (position is None or
+                                                 abs(applied_position - anchor) <= abs(position - anchor)):
+                position = None
+                break
+            applied_position = None
+            if position is not None:
+                break
+
+        if applied_position is not None:
+            report.append(f"hunk #{index} already applied")
+            offset += applied_position - anchor + len(hunk.new_lines()) - len(hunk.old_lines())
+            continue
+        if position is None:
+            raise PatchError(f"{file_patch.Source}: hunk #{index} does not apply to {file_patch.Path}")
+
+        new_lines = [line + eol for line in new]
+        if hunk.NewNoNewline and hunk.trailing_context(fuzz) == 0 and len(new_lines) > 0:
+            new_lines[-1] = new[-1]
+        stripped[position:position + len(old)] = new
+        lines[position:position + len(old)] = new_lines
+
+        hunk_offset = position - anchor
+        offset += hunk_offset + len(new) - len(old)
+        if hunk_offset != 0 or fuzz != 0:
+            report.append(f"hunk #{index} applied with offset {hunk_offset} and fuzz {fuzz}")
+        else:
+            report.append(f"hunk #{index} applied")
+
+    return ''.join(lines), report
+
+
+class PatchSet:
+
+    def __init__(self, patch_paths: list[str], replacements: dict[str, str]):
+        # Template and parse every patch once, keeping the untemplated patches to recognize files
+        # that were patched with other values
+        self.Placeholders = list(replacements.keys())
+        self.FilePatches = []
+        self.Templates = []
+        for patch_path in sorted(patch_paths):
+            with open(patch_path, 'r') as file:
+                template = file.read()
+            content = template
+            for placeholder, value in replacements.items():
+                content = content.replace(placeholder, value)
+            self.FilePatches.extend(parse_patch(content, patch_path))
+            self.Templates.extend(parse_patch(template, patch_path))
+
+    def check(self, repo_root: str) -> list[str]:
+        errors = []
+        self._patch_in_memory(repo_root, errors)
+        return errors
+
+    def apply(self, repo_root: str) -> bool:
+        # Every patch must apply before any file is written
+        errors = []
+        results = self._patch_in_memory(repo_root, errors)
+        if len(errors) > 0:
+            raise PatchError('\n'.join(errors))
+
+        changed = False
+        for target_file, (original, patched, reports) in results.items():
+            for source, report in reports:
+                print(f"{source}: {target_file}: {', '.join(report)}")
+            if patched == original:
+                continue
+
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target_file))
+            with os.fdopen(fd, 'w', newline='') as file:
+                file.write(patched)
+            os.chmod(temp_path, os.stat(target_file).st_mode)
+            os.replace(temp_path, target_file)
+            changed = True
+
+        return changed
+
+    def _patch_in_memory(self, repo_root: str, errors: list[str]) -> dict[str, tuple[str, str, list]]:
+        results = {}
+        for file_patch, template in zip(self.FilePatches, self.Templates):
+            target_file = os.path.join(repo_root, file_patch.Path)
+            if target_file not in results:
+                if not os.path.exists(target_file):
+                    errors.append(f"{file_patch.Source}: {target_file} does not exist")
+                    continue
+                with open(target_file, 'r', newline='') as file:
+                    content = file.read()
+                results[target_file] = (content, content, [])
+
+            original, patched, reports = results[target_file]
+            try:
+                patched, report = apply_hunks(patched, file_patch)
+            except PatchError as e:
+                if len(self.Placeholders) > 0 and applied_with_other_values(patched, template, self.Placeholders):
+                    errors.append(f"{file_patch.Source}: {target_file} was already patched with a different value "
+                                  f"for {' or '.join(self.Placeholders)}, re-clone the VMR or reset the component "
+                                  f"with 'git checkout -- .' in {repo_root}")
+                else:
+                    errors.append(str(e))
+                continue
+            reports.append((file_patch.Source, report))
+            results[target_file] = (original, patched, reports)
+
+        return results
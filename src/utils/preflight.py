@@ -0,0 +1,59 @@
+import os
+import shutil
+
+from src.utils.xml import get_xml_tag_content
+
+# Minimum free disk space in the working directory and total memory, in GiB,
+# needed to bootstrap each architecture. Cross builds also need room for the rootfs.
+ARCH_REQUIREMENTS = {
+    "amd64": {"disk": 50, "memory": 8},
+    "arm64": {"disk": 70, "memory": 8},
+    "s390x": {"disk": 70, "memory": 8},
+    "ppc64le": {"disk": 70, "memory": 8}
+}
+
+GIB = 1024 ** 3
+
+
+def check_props(props_dir: str, required_tags: dict[str, list[str]]) -> list[str]:
+    errors = []
+    for props_name, tags in required_tags.items():
+        props_file = os.path.join(props_dir, props_name)
+        if not os.path.exists(props_file):
+            errors.append(f"Props file '{props_file}' not found")
+            continue
+
+        for tag in tags:
+            if get_xml_tag_content(props_file, tag) is None:
+                errors.append(f"Tag <{tag}> not found in '{props_file}'")
+
+    return errors
+
+
+def check_disk_space(path: str, arch: str) -> list[str]:
+    required = ARCH_REQUIREMENTS[arch]["disk"]
+    free = shutil.disk_usage(path).free / GIB
+    if free < required:
+        return [f"Only {free:.1f} GiB free in '{path}', {required} GiB required for {arch}"]
+    return []
+
+
+def check_memory(arch: str) -> list[str]:
+    required = ARCH_REQUIREMENTS[arch]["memory"]
+    total = None
+    with open("/proc/meminfo", 'r') as file:
+        for line in file:
+            if line.startswith("MemTotal:"):
+                # MemTotal is reported in kB
+                total = int(line.split()[1]) * 1024 / GIB
+                break
+
+    if total is None:
+        return ["Could not determine total memory from /proc/meminfo"]
+    if total < required:
+        return [f"Only {total:.1f} GiB of memory available, {required} GiB required for {arch}"]
+    return []
+
+
+def check_tools(tools: list[str], path: str | None = None) -> list[str]:
+    return [f"Required tool '{tool}' not found" for tool in tools if shutil.which(tool, path=path) is None]
@@ -0,0 +1,196 @@
+import collections
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+from src.utils.logs import StageLog
+
+# How often the process tree is checked for activity, in seconds
+POLL_INTERVAL = 15
+# Number of output lines kept for stall reports
+TAIL_LINES = 200
+
+
+class ProcessStalledError(Exception):
+
+    def __init__(self, command: list[str], stall_timeout: int, report_path: str):
+        super().__init__(f"Command '{' '.join(command)}' made no progress for {stall_timeout} seconds "
+                         f"and was killed. See {report_path}")
+        self.Command = command
+        self.ReportPath = report_path
+
+
+def run_supervised(command: list[str],
+                   cwd: str | None = None,
+                   env: dict | None = None,
+                   stall_timeout: int | None = None,
+                   report_dir: str | None = None,
+                   log: StageLog | None = None) -> None:
+    sys.stdout.flush()
+
+    # Run the command in its own session so the whole process tree can be found and killed
+    process = subprocess.Popen(command, cwd=cwd, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                               start_new_session=True)
+
+    tail = collections.deque(maxlen=TAIL_LINES)
+    last_output = [time.monotonic()]
+    reader = threading.Thread(target=_forward_output, args=(process.stdout, tail, last_output, log),
+                              daemon=True)
+    reader.start()
+
+    last_activity = time.monotonic()
+    last_cpu_time = 0
+    while process.poll() is None:
+        try:
+            process.wait(POLL_INTERVAL)
+            break
+        except subprocess.TimeoutExpired:
+            pass
+
+        # The tree is alive as long as it writes output or consumes CPU
+        cpu_time = sum(_cpu_time(pid) for pid in _process_tree(process.pid))
+        now = time.monotonic()
+        if cpu_time != last_cpu_time or last_output[0] > last_activity:
+            last_activity = now
+            last_cpu_time = cpu_time
+        elif stall_timeout is not None and now - last_activity > stall_timeout:
+            report_path = _write_stall_report(command, cwd, process.pid, tail, report_dir)
+            _kill_tree(process.pid)
+            process.wait()
+            reader.join(POLL_INTERVAL)
+            print(f"Command '{' '.join(command)}' stalled, stall report written to {report_path}")
+            raise ProcessStalledError(command, stall_timeout, report_path)
+
+    # Don't wait forever on processes that outlive the command while holding its output open
+    reader.join(POLL_INTERVAL)
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, command)
+
+
+def retry(function, attempts: int, description: str, retry_on: tuple = (subprocess.CalledProcessError,
+                                                                           ProcessStalledError),
+          backoff: int = 30):
+    for attempt in range(1, attempts + 1):
+        try:
+            return function()
+        except retry_on as e:
+            if attempt == attempts:
+                raise
+            delay = backoff * 2 ** (attempt - 1)
+            print(f"{description} failed (attempt {attempt} of {attempts}): {e}")
+            print(f"Retrying in {delay} seconds...")
+            time.sleep(delay)
+
+
+def _forward_output(stream, tail: collections.deque, last_output: list[float], log: StageLog | None) -> None:
+    partial = b""
+    while chunk := os.read(stream.fileno(), 65536):
+        last_output[0] = time.monotonic()
+        lines = (partial + chunk).split(b"\n")
+        partial = lines.pop()
+        lines = [line.decode(errors="replace") for line in lines]
+        tail.extend(lines)
+
+        # With a log, the console only gets its progress lines unless asked for the full output
+        if log is not None:
+            log.write(chunk, lines)
+        if log is None or log.ConsoleOutput:
+            sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+    if partial:
+        tail.append(partial.decode(errors="replace"))
+        if log is not None:
+            log.write(b"", [partial.decode(errors="replace")])
+    stream.close()
+
+
+def _read_stat(pid: int) -> list[str] | None:
+    try:
+        with open(f"/proc/{pid}/stat", 'r') as file:
+            stat = file.read()
+    except OSError:
+        return None
+    # The command name may contain spaces, so split after its closing parenthesis.
+    # The remaining fields start at the process state (field 3 in proc(5)).
+    return stat[stat.rindex(')') + 2:].split()
+
+
+def _process_tree(root_pid: int) -> list[int]:
+    parents = {}
+    sessions = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            fields = _read_stat(int(entry))
+            if fields is not None:
+                parents[int(entry)] = int(fields[1])
+                sessions[int(entry)] = int(fields[3])
+
+    # Descendants of the root, plus anything left in its session after its parent exited
+    tree = {root_pid}
+    changed = True
+    while changed:
+        changed = False
+        for pid, parent in parents.items():
+            if pid not in tree and (parent in tree or sessions[pid] == root_pid):
+                tree.add(pid)
+                changed = True
+    return sorted(pid for pid in tree if pid in parents)
+
+
+def _cpu_time(pid: int) -> int:
+    fields = _read_stat(pid)
+    if fields is None:
+        return 0
+    # utime and stime, in clock ticks
+    return int(fields[11]) + int(fields[12])
+
+
+def _kill_tree(root_pid: int) -> None:
+    pids = _process_tree(root_pid)
+    try:
+        os.killpg(root_pid, signal.SIGKILL)
+    except OSError:
+        pass
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+
+def _read_proc_file(pid: int, name: str) -> str:
+    try:
+        with open(f"/proc/{pid}/{name}", 'rb') as file:
+            return file.read().replace(b"\0", b" ").decode(errors="replace").strip()
+    except OSError:
+        return "<unavailable>"
+
+
+def _write_stall_report(command: list[str], cwd: str | None, root_pid: int, tail: collections.deque,
+                        report_dir: str | None) -> str:
+    report_dir = report_dir if report_dir is not None else os.getcwd()
+    os.makedirs(report_dir, exist_ok=True)
+    report_path = os.path.join(report_dir, f"stall-{time.strftime('%Y-%m-%d_%H-%M-%S')}-{root_pid}.log")
+
+    with open(report_path, 'w') as report:
+        report.write(f"Command: {' '.join(command)}\n")
+        report.write(f"Working directory: {cwd}\n\n")
+
+        report.write("Process tree:\n")
+        for pid in _process_tree(root_pid):
+            fields = _read_stat(pid)
+            state = fields[0] if fields is not None else "?"
+            report.write(f"\n[{pid}] state={state} wchan={_read_proc_file(pid, 'wchan')}\n")
+            report.write(f"  cmdline: {_read_proc_file(pid, 'cmdline')}\n")
+            report.write("  kernel stack:\n")
+            for line in _read_proc_file(pid, "stack").splitlines():
+                report.write(f"    {line}\n")
+
+        report.write(f"\nLast {len(tail)} lines of output:\n")
+        for line in tail:
+            report.write(line + "\n")
+
+    return report_path
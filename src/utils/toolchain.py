@@ -0,0 +1,95 @@
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import stat
+import tempfile
+
+from src.utils.files import link_or_copy
+
+
+def read_toolchain(repo_root: str) -> tuple[str | None, dict[str, str]]:
+    # The .dotnet directory eng/common/tools.sh installs depends on the SDK and the extra runtimes
+    # listed under "tools", the MSBuild SDKs are restored into .packages
+    global_json_path = os.path.join(repo_root, "global.json")
+    if not os.path.exists(global_json_path):
+        return None, {}
+    with open(global_json_path, 'r') as file:
+        global_json = json.load(file)
+
+    tools = global_json.get("tools", {})
+    dotnet_key = None
+    if "dotnet" in tools:
+        requested = json.dumps({"dotnet": tools["dotnet"], "runtimes": tools.get("runtimes", {})}, sort_keys=True)
+        dotnet_key = f"{tools['dotnet']}-{hashlib.sha256(requested.encode()).hexdigest()[:12]}"
+
+    return dotnet_key, global_json.get("msbuild-sdks", {})
+
+
+# Files restored by hardlink. The SDK and NuGet only ever replace these, while other files such as
+# .nupkg.metadata, sentinel and workload files may be rewritten in place, so they are copied.
+IMMUTABLE_SUFFIXES = (".dll", ".so", ".a", ".nupkg", ".pdb", ".exe", ".winmd", ".targets", ".props", ".tar.gz")
+
+
+def _restore_file(source: str, destination: str) -> None:
+    if source.endswith(IMMUTABLE_SUFFIXES):
+        link_or_copy(source, destination)
+    else:
+        shutil.copy2(source, destination)
+        os.chmod(destination, os.stat(destination).st_mode | stat.S_IWUSR)
+
+
+def _make_read_only(path: str) -> None:
+    # Store files are never written, builds get their own copies of anything mutable
+    for root, _, files in os.walk(path):
+        for file in files:
+            file_path = os.path.join(root, file)
+            if not os.path.islink(file_path):
+                os.chmod(file_path, os.stat(file_path).st_mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+
+
+class ToolchainStore:
+
+    def __init__(self, store_dir: str):
+        self.StoreDir = os.path.abspath(store_dir)
+        os.makedirs(self.StoreDir, exist_ok=True)
+
+    def _entries(self, repo_root: str) -> list[tuple[str, str, str]]:
+        # (name, path in the store, path in the component) of everything the component can share
+        dotnet_key, msbuild_sdks = read_toolchain(repo_root)
+        entries = []
+        if dotnet_key is not None:
+            entries.append((f"dotnet-{dotnet_key}", os.path.join(self.StoreDir, "dotnet", dotnet_key),
+                            os.path.join(repo_root, ".dotnet")))
+        for sdk, version in msbuild_sdks.items():
+            entries.append((f"{sdk}-{version}", os.path.join(self.StoreDir, "packages", sdk.lower(), version),
+                            os.path.join(repo_root, ".packages", sdk.lower(), version)))
+        return entries
+
+    def restore(self, repo_root: str) -> list[str]:
+        restored = []
+        for name, stored, target in self._entries(repo_root):
+            if os.path.exists(stored) and not os.path.exists(target):
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.copytree(stored, target, symlinks=True, copy_function=_restore_file)
+                restored.append(name)
+        return restored
+
+    def harvest(self, repo_root: str) -> list[str]:
+        harvested = []
+        with open(os.path.join(self.StoreDir, ".lock"), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            for name, stored, target in self._entries(repo_root):
+                if os.path.exists(stored) or not os.path.exists(target):
+                    continue
+                # Copy rather than link, so later writes in the component can't reach the store.
+                # Entries appear in the store complete or not at all.
+                os.makedirs(os.path.dirname(stored), exist_ok=True)
+                staging = tempfile.mkdtemp(dir=os.path.dirname(stored))
+                shutil.copytree(target, os.path.join(staging, "tree"), symlinks=True)
+                _make_read_only(os.path.join(staging, "tree"))
+                os.rename(os.path.join(staging, "tree"), stored)
+                os.rmdir(staging)
+                harvested.append(name)
+        return harvested
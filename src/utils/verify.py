@@ -0,0 +1,102 @@
+from concurrent.futures import ThreadPoolExecutor
+import fnmatch
+import os
+import tarfile
+import zipfile
+import zlib
+
+from src.utils.nuget import normalize_version, read_nuspec
+
+# Paths each kind of tarball must contain, matched against the tarball's file name
+TARBALL_LAYOUTS = {
+    "dotnet-runtime-*.tar.gz": ["dotnet", "host/fxr", "shared/Microsoft.NETCore.App"],
+    "dotnet-sdk-*.tar.gz": ["dotnet", "host/fxr", "sdk", "shared/Microsoft.NETCore.App"],
+    "aspnetcore-runtime-*.tar.gz": ["shared/Microsoft.AspNetCore.App"]
+}
+
+
+def version_matches(version: str, expected_version: str) -> bool:
+    # Stabilized builds ship their Shipping packages with the bare version (8.0.8) while the
+    # NonShipping ones, such as ILAsm, keep the build's prerelease label (8.0.8-servicing.24366.12)
+    stable_version = expected_version.split('-')[0]
+    if version in (expected_version, stable_version):
+        return True
+    return '-' not in expected_version and version.split('-')[0] == expected_version
+
+
+def verify_zip(path: str) -> list[str]:
+    # Opening the archive only reads its central directory
+    try:
+        with zipfile.ZipFile(path) as archive:
+            size = os.path.getsize(path)
+            for info in archive.infolist():
+                if info.header_offset + info.compress_size > size:
+                    return [f"{path}: entry '{info.filename}' extends past the end of the file"]
+    except (zipfile.BadZipFile, OSError) as e:
+        return [f"{path}: not a valid zip archive ({e})"]
+    return []
+
+
+def verify_nupkg(path: str, expected_versions: dict[str, str]) -> list[str]:
+    errors = verify_zip(path)
+    if len(errors) > 0:
+        return errors
+
+    try:
+        package_id, version, _ = read_nuspec(path)
+    except (ValueError, zipfile.BadZipFile, zlib.error) as e:
+        return [f"{path}: could not read nuspec ({e})"]
+
+    file_names = {f"{package_id}.{version}.nupkg".lower(), f"{package_id}.{normalize_version(version)}.nupkg".lower()}
+    if os.path.basename(path).lower() not in file_names:
+        errors.append(f"{path}: file name does not match nuspec id '{package_id}' and version '{version}'")
+
+    for id_prefix, expected_version in expected_versions.items():
+        if package_id.lower().startswith(id_prefix.lower()) and not version_matches(version, expected_version):
+            errors.append(f"{path}: version '{version}' of '{package_id}' does not match "
+                          f"expected version '{expected_version}'")
+
+    return errors
+
+
+def verify_tarball(path: str, required_paths: list[str]) -> list[str]:
+    # Stream the archive without extracting it: a truncated or corrupt tarball fails to decompress
+    found = set()
+    try:
+        with tarfile.open(path, "r|gz") as archive:
+            for member in archive:
+                member_path = os.path.normpath(member.name)
+                for required_path in required_paths:
+                    if member_path == required_path or member_path.startswith(required_path + "/"):
+                        found.add(required_path)
+    except (tarfile.TarError, EOFError, zlib.error, OSError) as e:
+        return [f"{path}: incomplete or corrupt archive ({e})"]
+
+    return [f"{path}: missing '{required_path}'" for required_path in required_paths if required_path not in found]
+
+
+def verify_file(path: str, expected_versions: dict[str, str]) -> list[str]:
+    file_name = os.path.basename(path)
+    if file_name.endswith(".nupkg"):
+        return verify_nupkg(path, expected_versions)
+    if file_name.endswith(".zip"):
+        return verify_zip(path)
+    if file_name.endswith(".tar.gz"):
+        for pattern, required_paths in TARBALL_LAYOUTS.items():
+            if fnmatch.fnmatch(file_name, pattern):
+                return verify_tarball(path, required_paths)
+        return verify_tarball(path, [])
+    return []
+
+
+def verify_artifacts(directories: list[str], expected_versions: dict[str, str]) -> tuple[int, list[str]]:
+    paths = []
+    for directory in directories:
+        for root, _, files in os.walk(directory):
+            paths.extend(os.path.join(root, file) for file in files)
+
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        results = executor.map(lambda path: verify_file(path, expected_versions), paths)
+        errors = [error for result in results for error in result]
+
+    return len(paths), errors
@@ -0,0 +1,159 @@
+import os
+
+import pytest
+
+from src.utils.patches import PatchError, PatchSet, apply_hunks, parse_patch
+
+
+def file_patch(diff: str):
+    file_patches = parse_patch(diff, "test.patch")
+    assert len(file_patches) == 1
+    return file_patches[0]
+
+
+INSERT_AFTER_CONTEXT = """\
+--- file.txt
++++ file.txt
+@@ -1,3 +1,4 @@
+ a
+ b
+ c
++d
+"""
+
+REPLACE_LINE = """\
+--- file.txt
++++ file.txt
+@@ -2,3 +2,3 @@
+ b
+-c
++C
+ d
+"""
+
+
+def test_applies_hunk():
+    patched, report = apply_hunks("a\nb\nc\nd\ne\n", file_patch(REPLACE_LINE))
+    assert patched == "a\nb\nC\nd\ne\n"
+    assert report == ["hunk #1 applied"]
+
+
+def test_applies_hunk_at_offset():
+    patched, report = apply_hunks("x\nx\na\nb\nc\nd\ne\n", file_patch(REPLACE_LINE))
+    assert patched == "x\nx\na\nb\nC\nd\ne\n"
+    assert report == ["hunk #1 applied with offset 2 and fuzz 0"]
+
+
+def test_applies_hunk_with_fuzz():
+    patched, report = apply_hunks("a\nB\nc\nd\ne\n", file_patch(REPLACE_LINE))
+    assert patched == "a\nB\nC\nd\ne\n"
+    assert report == ["hunk #1 applied with offset 0 and fuzz 1"]
+
+
+def test_rejects_hunk_that_does_not_match():
+    with pytest.raises(PatchError):
+        apply_hunks("a\nb\nx\nd\ne\n", file_patch(REPLACE_LINE))
+
+
+def test_detects_applied_hunk():
+    patched, report = apply_hunks("a\nb\nC\nd\ne\n", file_patch(REPLACE_LINE))
+    assert patched == "a\nb\nC\nd\ne\n"
+    assert report == ["hunk #1 already applied"]
+
+
+def test_does_not_apply_insertion_twice():
+    patched, _ = apply_hunks("a\nb\nc\n", file_patch(INSERT_AFTER_CONTEXT))
+    assert patched == "a\nb\nc\nd\n"
+
+    patched_again, report = apply_hunks(patched, file_patch(INSERT_AFTER_CONTEXT))
+    assert patched_again == "a\nb\nc\nd\n"
+    assert report == ["hunk #1 already applied"]
+
+
+def test_keeps_offset_after_applied_hunk():
+    diff = """\
+--- file.txt
++++ file.txt
+@@ -1,2 +1,3 @@
+ a
++new
+ b
+@@ -5,2 +6,2 @@
+ e
+-f
++F
+"""
+    patched, report = apply_hunks("a\nnew\nb\nc\nd\ne\nf\n", file_patch(diff))
+    assert patched == "a\nnew\nb\nc\nd\ne\nF\n"
+    assert report == ["hunk #1 already applied", "hunk #2 applied"]
+
+
+def test_preserves_crlf():
+    patched, _ = apply_hunks("a\r\nb\r\nc\r\nd\r\ne\r\n", file_patch(REPLACE_LINE))
+    assert patched == "a\r\nb\r\nC\r\nd\r\ne\r\n"
+
+
+def test_preserves_missing_newline_at_end_of_file():
+    diff = """\
+--- file.txt
++++ file.txt
+@@ -1,3 +1,3 @@
+ a
+-b
++B
+ c
+\\ No newline at end of file
+"""
+    patched, _ = apply_hunks("a\nb\nc", file_patch(diff))
+    assert patched == "a\nB\nc"
+
+
+def test_patch_set_writes_nothing_when_a_hunk_fails(tmp_path):
+    patch_path = tmp_path / "component-change.patch"
+    patch_path.write_text(REPLACE_LINE.replace("+C", "+@@VALUE@@") + """\
+--- other.txt
++++ other.txt
+@@ -1,1 +1,1 @@
+-missing
++replaced
+""")
+    repo_root = tmp_path / "repo"
+    repo_root.mkdir()
+    (repo_root / "file.txt").write_text("a\nb\nc\nd\ne\n")
+    (repo_root / "other.txt").write_text("something else\n")
+
+    patch_set = PatchSet([str(patch_path)], {"@@VALUE@@": "value"})
+    assert len(patch_set.check(str(repo_root))) == 1
+    with pytest.raises(PatchError):
+        patch_set.apply(str(repo_root))
+    assert (repo_root / "file.txt").read_text() == "a\nb\nc\nd\ne\n"
+
+
+def test_patch_set_applies_once(tmp_path):
+    patch_path = tmp_path / "component-change.patch"
+    patch_path.write_text(REPLACE_LINE.replace("+C", "+@@VALUE@@"))
+    repo_root = tmp_path / "repo"
+    repo_root.mkdir()
+    target = repo_root / "file.txt"
+    target.write_text("a\nb\nc\nd\ne\n")
+    os.chmod(target, 0o640)
+
+    patch_set = PatchSet([str(patch_path)], {"@@VALUE@@": "value"})
+    assert patch_set.apply(str(repo_root))
+    assert target.read_text() == "a\nb\nvalue\nd\ne\n"
+    assert os.stat(target).st_mode & 0o777 == 0o640
+    assert not patch_set.apply(str(repo_root))
+
+
+def test_patch_set_reports_other_placeholder_value(tmp_path):
+    patch_path = tmp_path / "component-change.patch"
+    patch_path.write_text(REPLACE_LINE.replace("+C", "+path=@@VALUE@@/packages"))
+    repo_root = tmp_path / "repo"
+    repo_root.mkdir()
+    target = repo_root / "file.txt"
+    target.write_text("a\nb\nc\nd\ne\n")
+
+    assert PatchSet([str(patch_path)], {"@@VALUE@@": "/old"}).apply(str(repo_root))
+    with pytest.raises(PatchError, match="already patched with a different value for @@VALUE@@"):
+        PatchSet([str(patch_path)], {"@@VALUE@@": "/new"}).apply(str(repo_root))
+    assert target.read_text() == "a\nb\npath=/old/packages\nd\ne\n"
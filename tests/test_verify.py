@@ -0,0 +1,40 @@
+import zipfile
+
+from src.utils.verify import verify_artifacts
+
+
+def write_nupkg(directory, package_id: str, version: str) -> None:
+    with zipfile.ZipFile(directory / f"{package_id}.{version}.nupkg", 'w') as nupkg:
+        nupkg.writestr(f"{package_id}.nuspec",
+                       f"<package><metadata><id>{package_id}</id><version>{version}</version></metadata></package>")
+
+
+def write_stabilized_build(directory) -> None:
+    # A stabilized build: Shipping packages get the bare version, NonShipping ones keep the build version
+    write_nupkg(directory, "Microsoft.NETCore.App.Runtime.linux-s390x", "8.0.8")
+    write_nupkg(directory, "runtime.linux-s390x.Microsoft.NETCore.DotNetHost", "8.0.8")
+    write_nupkg(directory, "runtime.linux-s390x.Microsoft.NETCore.ILAsm", "8.0.8-servicing.24366.12")
+
+
+def expected_versions(runtime_version: str) -> dict[str, str]:
+    return {"Microsoft.NETCore.App.": runtime_version, "runtime.linux-s390x.Microsoft.NETCore.": runtime_version}
+
+
+def test_accepts_stabilized_build_against_build_version(tmp_path):
+    write_stabilized_build(tmp_path)
+    verified, errors = verify_artifacts([str(tmp_path)], expected_versions("8.0.8-servicing.24366.12"))
+    assert verified == 3
+    assert errors == []
+
+
+def test_accepts_stabilized_build_against_stabilized_version(tmp_path):
+    write_stabilized_build(tmp_path)
+    _, errors = verify_artifacts([str(tmp_path)], expected_versions("8.0.8"))
+    assert errors == []
+
+
+def test_rejects_other_versions(tmp_path):
+    write_nupkg(tmp_path, "Microsoft.NETCore.App.Runtime.linux-s390x", "8.0.7")
+    write_nupkg(tmp_path, "runtime.linux-s390x.Microsoft.NETCore.ILAsm", "8.0.8-servicing.24300.1")
+    _, errors = verify_artifacts([str(tmp_path)], expected_versions("8.0.8-servicing.24366.12"))
+    assert len(errors) == 2